@@ -1,387 +1,371 @@
 import streamlit as st
-import pandas as pd
-import numpy as np
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
+import functools
+import hashlib
+import importlib.util
+import io
+import os
 import warnings
+from datetime import datetime
+# pandas, plotly ve analiz motoru ilk dosya yüklendiğinde içe aktarılır; boş
+# karşılama sayfası bu kütüphaneleri yüklemeden açılır
 warnings.filterwarnings('ignore')
 
-st.set_page_config(
-    page_title="Doğalgaz Anomali Tespit Sistemi",
-    page_icon="🔥",
-    layout="wide"
-)
+# Şüpheli tesisatlar tablosunun sayfa boyutları
+PAGE_SIZES = [25, 50, 100, 250]
 
-st.header("📈 Genel İstatistikler")
+# Detay seçicisinde arama yapılmadığında listelenen en riskli tesisat sayısı
+PICKER_LIMIT = 200
 
-# CSS ile görsel iyileştirmeler
-st.markdown("""
-<style>
-    .main-header {
-        font-size: 2.5rem;
-        font-weight: bold;
-        color: #FF6B35;
-        text-align: center;
-        margin-bottom: 2rem;
-        text-shadow: 2px 2px 4px rgba(0,0,0,0.1);
-    }
-    
-    .stApp {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-    }
-    
-    .main > div {
-        background: white;
-        border-radius: 15px;
-        padding: 2rem;
-        margin: 1rem;
-        box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
-    }
-    
-    .metric-card {
-        background: linear-gradient(135deg, #FF6B35, #F7931E);
-        padding: 1.5rem;
-        border-radius: 15px;
-        color: white;
-        text-align: center;
-        margin: 0.5rem 0;
-        box-shadow: 0 8px 16px rgba(0,0,0,0.2);
-        transition: transform 0.3s ease;
-    }
-    
-    .metric-card:hover {
-        transform: translateY(-5px);
-    }
-    
-    .warning-card {
-        background: linear-gradient(135deg, #FFA726, #FF9800);
-        padding: 1.5rem;
-        border-radius: 15px;
-        color: white;
-        text-align: center;
-        box-shadow: 0 8px 16px rgba(0,0,0,0.2);
-        transition: transform 0.3s ease;
-    }
-    
-    .warning-card:hover {
-        transform: translateY(-5px);
-    }
-    
-    .success-card {
-        background: linear-gradient(135deg, #66BB6A, #4CAF50);
-        padding: 1.5rem;
-        border-radius: 15px;
-        color: white;
-        text-align: center;
-        box-shadow: 0 8px 16px rgba(0,0,0,0.2);
-        transition: transform 0.3s ease;
-    }
-    
-    .success-card:hover {
-        transform: translateY(-5px);
-    }
-    
-    .info-card {
-        background: linear-gradient(135deg, #42A5F5, #2196F3);
-        padding: 1.5rem;
-        border-radius: 15px;
-        color: white;
-        text-align: center;
-        box-shadow: 0 8px 16px rgba(0,0,0,0.2);
-        transition: transform 0.3s ease;
-    }
-    
-    .info-card:hover {
-        transform: translateY(-5px);
-    }
-    
-    .sidebar .stSelectbox label {
-        color: #FF6B35;
-        font-weight: bold;
-    }
-    
-    .sidebar .stSlider label {
-        color: #FF6B35;
-        font-weight: bold;
-    }
-    
-    .stButton > button {
-        background: linear-gradient(135deg, #FF6B35, #F7931E);
-        color: white;
-        border: none;
-        border-radius: 25px;
-        padding: 0.5rem 2rem;
-        font-weight: bold;
-        box-shadow: 0 4px 8px rgba(0,0,0,0.2);
-        transition: all 0.3s ease;
-    }
-    
-    .stButton > button:hover {
-        transform: translateY(-2px);
-        box-shadow: 0 6px 12px rgba(0,0,0,0.3);
-    }
-    
-    .stDataFrame {
-        border-radius: 10px;
-        overflow: hidden;
-        box-shadow: 0 4px 8px rgba(0,0,0,0.1);
-    }
-    
-    .analysis-section {
-        background: linear-gradient(135deg, #f8f9fa, #e9ecef);
-        padding: 2rem;
-        border-radius: 15px;
-        margin: 1rem 0;
-        border-left: 5px solid #FF6B35;
-    }
+# Grafik veri boyutu sınırları
+HISTOGRAM_BINS = 20
+CHART_TOP_BUILDINGS = 30
+
+# Rapor formatlarının adları ve gerektirdikleri kütüphaneler
+REPORT_FORMAT_LABELS = {'xlsx': 'Excel', 'csv': 'CSV', 'parquet': 'Parquet'}
+REPORT_FORMAT_MODULES = {'xlsx': 'openpyxl', 'parquet': 'pyarrow'}
+
+# Birden fazla dosyada aynı TN için çakışma kuralları
+TN_CONFLICT_LABELS = {
+    'last': "Sonraki dosyadaki değer geçerli",
+    'first': "İlk dosyadaki değer geçerli",
+    'max': "En büyük değer geçerli",
+}
+
+# Hızlı taramada sadece bu maliyete kadar olan dedektörler çalışır
+QUICK_SCAN_MAX_COST = 1
+
+# Arka plan analizi: bu süre içinde biten analizler ilerleme çubuğu gösterilmeden kullanılır
+QUICK_ANALYSIS_SECONDS = 0.5
+PROGRESS_REFRESH_SECONDS = 0.5
+
+# Oturumda saklanan analiz sonucu sayısı (dosya özeti, eşikler, dedektörler)
+MAX_SESSION_RESULTS = 8
+
+# İlerleme aşamalarının adları ve birimleri
+PROGRESS_STAGES = {
+    'facility_stats': ("Tesisat istatistikleri", "tesisat"),
+    'drop_counts': ("Ani düşüş taraması", "ay"),
+    'detect_anomalies': ("Risk skorları", "tesisat"),
+}
+
+def configure_page():
+    """Sayfa ayarları ve stiller; her çalıştırmada ilk olarak çağrılır"""
+    st.set_page_config(
+        page_title="Doğalgaz Anomali Tespit Sistemi",
+        page_icon="🔥",
+        layout="wide"
+    )
     
-    .parameter-card {
-        background: linear-gradient(135deg, #667eea, #764ba2);
-        padding: 1rem;
-        border-radius: 10px;
-        color: white;
-        margin: 0.5rem 0;
+    st.header("📈 Genel İstatistikler")
+    
+    # CSS ile görsel iyileştirmeler
+    st.markdown("""
+    <style>
+        .main-header {
+            font-size: 2.5rem;
+            font-weight: bold;
+            color: #FF6B35;
+            text-align: center;
+            margin-bottom: 2rem;
+            text-shadow: 2px 2px 4px rgba(0,0,0,0.1);
+        }
+    
+        .stApp {
+            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+        }
+    
+        .main > div {
+            background: white;
+            border-radius: 15px;
+            padding: 2rem;
+            margin: 1rem;
+            box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
+        }
+    
+        .metric-card {
+            background: linear-gradient(135deg, #FF6B35, #F7931E);
+            padding: 1.5rem;
+            border-radius: 15px;
+            color: white;
+            text-align: center;
+            margin: 0.5rem 0;
+            box-shadow: 0 8px 16px rgba(0,0,0,0.2);
+            transition: transform 0.3s ease;
+        }
+    
+        .metric-card:hover {
+            transform: translateY(-5px);
+        }
+    
+        .warning-card {
+            background: linear-gradient(135deg, #FFA726, #FF9800);
+            padding: 1.5rem;
+            border-radius: 15px;
+            color: white;
+            text-align: center;
+            box-shadow: 0 8px 16px rgba(0,0,0,0.2);
+            transition: transform 0.3s ease;
+        }
+    
+        .warning-card:hover {
+            transform: translateY(-5px);
+        }
+    
+        .success-card {
+            background: linear-gradient(135deg, #66BB6A, #4CAF50);
+            padding: 1.5rem;
+            border-radius: 15px;
+            color: white;
+            text-align: center;
+            box-shadow: 0 8px 16px rgba(0,0,0,0.2);
+            transition: transform 0.3s ease;
+        }
+    
+        .success-card:hover {
+            transform: translateY(-5px);
+        }
+    
+        .info-card {
+            background: linear-gradient(135deg, #42A5F5, #2196F3);
+            padding: 1.5rem;
+            border-radius: 15px;
+            color: white;
+            text-align: center;
+            box-shadow: 0 8px 16px rgba(0,0,0,0.2);
+            transition: transform 0.3s ease;
+        }
+    
+        .info-card:hover {
+            transform: translateY(-5px);
+        }
+    
+        .sidebar .stSelectbox label {
+            color: #FF6B35;
+            font-weight: bold;
+        }
+    
+        .sidebar .stSlider label {
+            color: #FF6B35;
+            font-weight: bold;
+        }
+    
+        .stButton > button {
+            background: linear-gradient(135deg, #FF6B35, #F7931E);
+            color: white;
+            border: none;
+            border-radius: 25px;
+            padding: 0.5rem 2rem;
+            font-weight: bold;
+            box-shadow: 0 4px 8px rgba(0,0,0,0.2);
+            transition: all 0.3s ease;
+        }
+    
+        .stButton > button:hover {
+            transform: translateY(-2px);
+            box-shadow: 0 6px 12px rgba(0,0,0,0.3);
+        }
+    
+        .stDataFrame {
+            border-radius: 10px;
+            overflow: hidden;
+            box-shadow: 0 4px 8px rgba(0,0,0,0.1);
+        }
+    
+        .analysis-section {
+            background: linear-gradient(135deg, #f8f9fa, #e9ecef);
+            padding: 2rem;
+            border-radius: 15px;
+            margin: 1rem 0;
+            border-left: 5px solid #FF6B35;
+        }
+    
+        .parameter-card {
+            background: linear-gradient(135deg, #667eea, #764ba2);
+            padding: 1rem;
+            border-radius: 10px;
+            color: white;
+            margin: 0.5rem 0;
+        }
+    </style>
+    """, unsafe_allow_html=True)
+
+def performance_table(performance):
+    """PerformanceLog kayıtları; iç içe aşamalar girintili gösterilir"""
+    performance_df = performance.to_frame()
+    performance_df['Aşama'] = ['    ' * level + name for level, name in zip(performance_df['Düzey'], performance_df['Aşama'])]
+    return performance_df.drop(columns='Düzey')
+
+def consumption_chart(detector, row, tn):
+    """Tesisatın tüketim eğrisi ve karşılaştırma için binasının aylık medyan eğrisi"""
+    import plotly.graph_objects as go
+    
+    labels = detector.schema.labels()
+    fig = go.Figure()
+    fig.add_trace(go.Scattergl(x=labels, y=detector.facility_consumption(row), mode='lines', name=f"Tesisat {tn}"))
+    bn = detector.df['BN'].iat[row]
+    building_profile = detector.building_profile(bn)
+    if building_profile is not None:
+        fig.add_trace(go.Scattergl(
+            x=labels, y=building_profile, mode='lines', name=f"Bina {bn} medyanı", line={'dash': 'dash'}
+        ))
+    fig.update_layout(
+        title=f"Tesisat {tn} - Tüketim Grafiği", xaxis_title='Tarih', yaxis_title='Tüketim (m³)', xaxis_tickangle=-45
+    )
+    return fig
+
+def upload_digests(uploaded_files, state_key):
+    """Yüklenen dosyaların SHA-256 özetleri; her yükleme (file_id) için bir kez hesaplanır
+    
+    Özetler oturumda state_key altında tutulur, yeniden çalıştırmalarda dosya
+    içeriği tekrar okunmaz. Kaldırılan dosyaların özetleri silinir.
+    """
+    known = st.session_state.get(state_key, {})
+    digests = {
+        f.file_id: known[f.file_id] if f.file_id in known else hashlib.sha256(f.getvalue()).hexdigest()
+        for f in uploaded_files
     }
-</style>
-""", unsafe_allow_html=True)
+    st.session_state[state_key] = digests
+    return [digests[f.file_id] for f in uploaded_files]
 
-class GasLeakDetector:
-    def __init__(self):
-        self.df = None
-        self.suspicious_facilities = []
-        
-    def load_data(self, uploaded_file):
-        """Excel dosyasını yükle ve temizle"""
-        try:
-            # Farklı dosya formatlarını destekle
-            if uploaded_file.name.endswith('.xlsx'):
-                self.df = pd.read_excel(uploaded_file, engine='openpyxl')
-            elif uploaded_file.name.endswith('.xls'):
-                self.df = pd.read_excel(uploaded_file, engine='xlrd')
-            else:
-                # CSV olarak da deneyelim
-                self.df = pd.read_csv(uploaded_file)
-            
-            st.success(f"✅ Dosya yüklendi: {uploaded_file.name}")
-            st.info(f"📊 Veri boyutu: {self.df.shape[0]} satır, {self.df.shape[1]} sütun")
-            
-            return True
-        except Exception as e:
-            st.error(f"❌ Dosya yüklenirken hata: {str(e)}")
-            st.info("💡 Lütfen dosyanızın Excel (.xlsx, .xls) formatında olduğundan emin olun.")
-            return False
-    
-    def preprocess_data(self):
-        """Veriyi ön işleme"""
-        if self.df is None:
-            return False
-            
-        # Tarih sütunlarını tespit et (2016-2025 arası)
-        date_columns = []
-        for col in self.df.columns:
-            if any(year in str(col) for year in range(2016, 2026)):
-                date_columns.append(col)
-        
-        # Sadece sayısal verileri al
-        numeric_columns = ['TN', 'BN'] + date_columns
-        self.df = self.df[numeric_columns]
-        
-        # Eksik verileri 0 ile doldur
-        self.df[date_columns] = self.df[date_columns].fillna(0)
-        
-        # Negatif değerleri 0 yap
-        self.df[date_columns] = self.df[date_columns].clip(lower=0)
-        
-        return True
-    
-    def detect_anomalies(self, low_threshold=30, neighbor_threshold=60, drop_threshold=70):
-        """Anomali tespiti algoritmaları"""
-        if self.df is None:
-            return []
-        
-        date_columns = [col for col in self.df.columns if any(year in str(col) for year in range(2016, 2026))]
-        suspicious_list = []
-        
-        for idx, row in self.df.iterrows():
-            tn = row['TN']
-            bn = row['BN']
-            consumption_data = row[date_columns].values
-            
-            # Anomali testleri
-            anomalies = []
-            risk_score = 0
-            
-            # 1. Ani düşüş tespiti
-            sudden_drops = self._detect_sudden_drops(consumption_data, drop_threshold)
-            if sudden_drops['count'] > 0:
-                anomalies.append(f"Ani düşüş: {sudden_drops['count']} kez")
-                risk_score += sudden_drops['count'] * 20
-            
-            # 2. Sıfır tüketim tespiti
-            zero_consumption = self._detect_zero_consumption(consumption_data)
-            if zero_consumption['count'] > 0:
-                anomalies.append(f"Sıfır tüketim: {zero_consumption['count']} ay")
-                risk_score += zero_consumption['count'] * 15
-            
-            # 3. Düşük tüketim tespiti
-            low_consumption = self._detect_low_consumption(consumption_data, low_threshold)
-            if low_consumption['suspicious']:
-                anomalies.append(f"Düşük tüketim: Ortalama {low_consumption['avg_consumption']:.1f}")
-                risk_score += 25
-            
-            # 4. Trend analizi
-            trend_anomaly = self._detect_trend_anomaly(consumption_data)
-            if trend_anomaly['suspicious']:
-                anomalies.append(f"Trend anomalisi: {trend_anomaly['description']}")
-                risk_score += 30
-            
-            # 5. Mevsimsel anomali
-            seasonal_anomaly = self._detect_seasonal_anomaly(consumption_data)
-            if seasonal_anomaly['suspicious']:
-                anomalies.append(f"Mevsimsel anomali: {seasonal_anomaly['description']}")
-                risk_score += 20
-            
-            # 6. Komşu tesisatlarla karşılaştırma
-            neighbor_anomaly = self._compare_with_neighbors(bn, tn, consumption_data, neighbor_threshold)
-            if neighbor_anomaly['suspicious']:
-                anomalies.append(f"Komşu anomalisi: {neighbor_anomaly['description']}")
-                risk_score += 35
-            
-            # Risk seviyesi belirleme
-            if risk_score >= 70:
-                risk_level = "Yüksek Risk"
-            elif risk_score >= 40:
-                risk_level = "Orta Risk"
-            elif risk_score >= 20:
-                risk_level = "Düşük Risk"
-            else:
-                risk_level = "Normal"
-            
-            if anomalies:
-                suspicious_list.append({
-                    'TN': tn,
-                    'BN': bn,
-                    'Risk_Skoru': risk_score,
-                    'Risk_Seviyesi': risk_level,
-                    'Anomaliler': '; '.join(anomalies),
-                    'Ortalama_Tuketim': np.mean(consumption_data),
-                    'Toplam_Tuketim': np.sum(consumption_data),
-                    'Son_6_Ay_Ortalama': np.mean(consumption_data[-6:]),
-                    'İlk_6_Ay_Ortalama': np.mean(consumption_data[:6])
-                })
-        
-        return suspicious_list
-    
-    def _detect_sudden_drops(self, data, threshold=70):
-        """Ani düşüş tespiti"""
-        drops = 0
-        for i in range(1, len(data)):
-            if data[i-1] > 0 and data[i] < data[i-1] * ((100-threshold)/100):
-                drops += 1
-        return {'count': drops}
-    
-    def _detect_zero_consumption(self, data):
-        """Sıfır tüketim tespiti"""
-        zero_count = np.sum(data == 0)
-        return {'count': zero_count}
-    
-    def _detect_low_consumption(self, data, threshold=30):
-        """Düşük tüketim tespiti"""
-        non_zero_data = data[data > 0]
-        if len(non_zero_data) == 0:
-            return {'suspicious': True, 'avg_consumption': 0}
-        
-        avg_consumption = np.mean(non_zero_data)
-        
-        # Parametre olarak gelen threshold'u kullan
-        if avg_consumption < threshold:
-            return {'suspicious': True, 'avg_consumption': avg_consumption}
-        
-        return {'suspicious': False, 'avg_consumption': avg_consumption}
-    
-    def _detect_trend_anomaly(self, data):
-        """Trend anomalisi tespiti"""
-        # Son 24 ayın ortalamasını al
-        recent_data = data[-24:]
-        if len(recent_data) < 12:
-            return {'suspicious': False, 'description': ''}
-        
-        # Lineer trend hesapla
-        x = np.arange(len(recent_data))
-        z = np.polyfit(x, recent_data, 1)
-        trend_slope = z[0]
+@st.cache_resource(max_entries=4, show_spinner="Dosya işleniyor...")
+def load_detector(file_hash, file_names, _files, tn_conflict='last', _n_jobs=1):
+    """Dosyaları yükle ve ön işle; sonuç dosya içeriklerinin özetiyle önbelleğe alınır
+    
+    Birden fazla dosya veya çok sayfalı Excel dosyaları işçi süreçlerde okunup
+    TN'ye göre tek tabloda birleştirilir.
+    """
+    from gas_leak_detector import GasLeakDetector
+    
+    # Dosya içerikleri sadece önbellekte yoksa okunur
+    buffers = []
+    for file_name, uploaded_file in zip(file_names, _files):
+        buffer = io.BytesIO(uploaded_file.getvalue())
+        buffer.name = file_name
+        buffers.append(buffer)
+    file_name = ', '.join(file_names)
+    
+    detector = GasLeakDetector(n_jobs=_n_jobs)
+    
+    # Aynı dosya daha önce işlendiyse tablo ayrıştırma tamamen atlanır
+    if detector.load_cache(file_hash) and detector.preprocess_data():
+        # Daha önce saklanan tesisat istatistikleri varsa analiz de baştan yapılmaz
+        detector.load_stats(file_hash)
+        st.success(f"✅ Dosya önbellekten yüklendi: {file_name}")
+        return detector
+    
+    if detector.load_files(buffers, tn_conflict) and detector.preprocess_data():
+        st.success(f"✅ Dosya yüklendi: {file_name}")
+        st.info(f"📊 Veri boyutu: {detector.df.shape[0]} satır, {detector.df.shape[1]} sütun")
+        detector.save_cache(file_hash)
+        return detector
+    
+    st.error(f"❌ Dosya yüklenirken hata: {detector.load_error}")
+    st.info("💡 Lütfen dosyanızın Excel (.xlsx, .xls) formatında olduğundan emin olun.")
+    return None
+
+@st.cache_resource(max_entries=4, show_spinner="Yeni aylar ekleniyor...")
+def load_updated_detector(file_hash, delta_hashes, delta_names, _delta_files, _detector):
+    """Geçmiş verinin dedektörüne yeni ay dosyalarını sırayla ekle; geçmiş yeniden analiz edilmez"""
+    with _detector.analysis_lock:
+        # Geçmişin istatistikleri sonraki aylarda tekrar kullanılmak üzere saklanır
+        _detector.save_stats(file_hash)
         
-        # Eğer trend çok negatifse (sürekli azalma) şüpheli
-        if trend_slope < -5:
-            return {'suspicious': True, 'description': 'Sürekli azalan tüketim trendi'}
+        detector = _detector
+        for name, delta_file in zip(delta_names, _delta_files):
+            buffer = io.BytesIO(delta_file.getvalue())
+            buffer.name = name
+            updated = detector.with_delta(buffer)
+            if updated is None:
+                st.error(f"❌ {name} eklenemedi: {detector.load_error}")
+                return None
+            detector = updated
+    
+    st.success(f"✅ {len(delta_names)} dosyadan yeni aylar eklendi, son ay: {detector.schema.labels()[-1]}")
+    return detector
+
+def analysis_result(analysis_key, detector, track_memory=False, n_jobs=None):
+    """Analiz sonucunu döndür; analiz arka planda sürüyorsa ilerlemeyi gösterip None döndür
+    
+    Sonuçlar oturumda (dosya özeti, eşikler, dedektörler) anahtarıyla saklanır.
+    Eşikler veya dedektörler iş sürerken değişirse eski iş iptal edilip yenisi başlatılır.
+    track_memory açıksa analizin aşamalarında tepe bellek de ölçülür. track_memory
+    ve n_jobs sadece bu analize uygulanır; oturumlar arasında paylaşılan dedektör değişmez.
+    """
+    results = st.session_state.setdefault('analysis_results', {})
+    if analysis_key in results:
+        return results[analysis_key]
+    
+    job_key, job = st.session_state.get('analysis_job', (None, None))
+    if job_key != analysis_key:
+        from gas_leak_detector import AnalysisJob
         
-        return {'suspicious': False, 'description': ''}
+        if job is not None:
+            job.cancel()
+        job = AnalysisJob(detector, *analysis_key[1:], track_memory=track_memory, n_jobs=n_jobs)
+        st.session_state['analysis_job'] = (analysis_key, job)
+    
+    if not job.wait(QUICK_ANALYSIS_SECONDS):
+        show_analysis_progress(job)
+        return None
+    
+    del st.session_state['analysis_job']
+    if job.cancelled:
+        st.session_state.pop('analyzed_file', None)
+        st.warning("⏹️ Analiz iptal edildi.")
+        return None
+    
+    if len(results) >= MAX_SESSION_RESULTS:
+        results.pop(next(iter(results)))
+    results[analysis_key] = job.result()
+    return results[analysis_key]
+
+@st.fragment(run_every=PROGRESS_REFRESH_SECONDS)
+def show_analysis_progress(job):
+    """Arka plan analizinin ilerlemesi; iş bitince sayfa yeniden çalıştırılır"""
+    if job.done():
+        st.rerun()
+    
+    if job.stage in PROGRESS_STAGES:
+        label, unit = PROGRESS_STAGES[job.stage]
+        text = f"Anomali tespiti yapılıyor: {label} ({job.done_units:,}/{job.total_units:,} {unit})"
+    else:
+        text = "Anomali tespiti başlatılıyor..."
+    st.progress(job.progress, text=text)
     
-    def _detect_seasonal_anomaly(self, data):
-        """Mevsimsel anomali tespiti"""
-        if len(data) < 24:
-            return {'suspicious': False, 'description': ''}
-        
-        # Kış ayları (Aralık, Ocak, Şubat) ve yaz ayları (Haziran, Temmuz, Ağustos)
-        # Basit mevsimsel kontrol
-        winter_months = []
-        summer_months = []
-        
-        for i in range(len(data)):
-            month = (i % 12) + 1
-            if month in [12, 1, 2]:  # Kış ayları
-                winter_months.append(data[i])
-            elif month in [6, 7, 8]:  # Yaz ayları
-                summer_months.append(data[i])
-        
-        if len(winter_months) > 0 and len(summer_months) > 0:
-            winter_avg = np.mean(winter_months)
-            summer_avg = np.mean(summer_months)
-            
-            # Kış aylarında tüketim yaz aylarından az ise şüpheli
-            if winter_avg < summer_avg * 0.8:
-                return {'suspicious': True, 'description': 'Kış aylarında beklenenden düşük tüketim'}
-        
-        return {'suspicious': False, 'description': ''}
+    if st.button("⏹️ Analizi İptal Et"):
+        job.cancel()
+
+def available_report_formats():
+    """Gerekli kütüphanesi kurulu olan rapor formatları"""
+    from gas_leak_detector import REPORT_FORMATS
+    
+    return [
+        fmt for fmt in REPORT_FORMATS
+        if fmt not in REPORT_FORMAT_MODULES or importlib.util.find_spec(REPORT_FORMAT_MODULES[fmt]) is not None
+    ]
+
+@st.cache_resource
+def result_store():
+    """Analiz geçmişinin yerel SQLite deposu"""
+    from results_store import ResultStore
     
-    def _compare_with_neighbors(self, bn, tn, data, threshold=60):
-        """Komşu tesisatlarla karşılaştırma"""
-        # Aynı binadaki diğer tesisatları bul
-        neighbors = self.df[self.df['BN'] == bn]
-        
-        if len(neighbors) <= 1:
-            return {'suspicious': False, 'description': ''}
-        
-        # Kendi verisini çıkar
-        neighbors = neighbors[neighbors['TN'] != tn]
-        
-        if len(neighbors) == 0:
-            return {'suspicious': False, 'description': ''}
-        
-        # Komşuların ortalama tüketimini hesapla
-        date_columns = [col for col in self.df.columns if any(year in str(col) for year in range(2016, 2026))]
-        neighbor_consumptions = []
-        
-        for _, neighbor in neighbors.iterrows():
-            neighbor_data = neighbor[date_columns].values
-            neighbor_avg = np.mean(neighbor_data[neighbor_data > 0])
-            if not np.isnan(neighbor_avg):
-                neighbor_consumptions.append(neighbor_avg)
-        
-        if len(neighbor_consumptions) == 0:
-            return {'suspicious': False, 'description': ''}
-        
-        current_avg = np.mean(data[data > 0])
-        neighbor_avg = np.mean(neighbor_consumptions)
-        
-        # Parametre olarak gelen threshold'u kullan
-        if current_avg < neighbor_avg * (threshold/100):
-            return {'suspicious': True, 'description': f'Komşulardan {((neighbor_avg - current_avg) / neighbor_avg * 100):.0f}% daha az tüketim'}
-        
-        return {'suspicious': False, 'description': ''}
+    return ResultStore()
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def build_report(report_key, report_format, _result, _summary, _buildings):
+    """Rapor dosyasını üret; (dosya özeti, eşikler, dedektörler, format) anahtarıyla önbelleğe alınır
+    
+    İndirme butonuna tıklandığında çağrılır, aynı raporun tekrar indirilmesi
+    dosyayı yeniden üretmez.
+    """
+    from gas_leak_detector import write_report
+    
+    output = io.BytesIO()
+    write_report(_result, output, report_format, summary=_summary, buildings=_buildings)
+    return output.getvalue()
 
 def main():
+    configure_page()
     st.markdown('<h1 class="main-header">🔥 Doğalgaz Tüketim Anomali Tespit Sistemi</h1>', unsafe_allow_html=True)
     
     # Sidebar
@@ -391,8 +375,6 @@ def main():
     </div>
     """, unsafe_allow_html=True)
     
-    detector = GasLeakDetector()
-    
     # Sidebar parametreleri
     st.sidebar.markdown("### 📊 Analiz Parametreleri")
     
@@ -424,7 +406,29 @@ def main():
         min_value=40, 
         max_value=90, 
         value=70,
-        help="Bir aydan diğerine bu kadar düşüş şüpheli kabul edilir"
+        help="Bir aydan diğerine (ve bir kıştan sonrakine) bu kadar düşüş şüpheli kabul edilir"
+    )
+    
+    min_previous_winter = st.sidebar.slider(
+        "Minimum önceki kış tüketimi (m³/ay)",
+        min_value=50,
+        max_value=200,
+        value=100,
+        help="Kış düşüşü için önceki kışın aylık ortalaması en az bu kadar olmalı"
+    )
+    
+    n_jobs = st.sidebar.number_input(
+        "Paralel işlem sayısı",
+        min_value=1,
+        max_value=os.cpu_count() or 1,
+        value=1,
+        step=1,
+        help="Büyük dosyalarda analiz binalara bölünerek bu kadar işlemde yürütülür"
+    )
+    
+    show_performance = st.sidebar.checkbox(
+        "⏱️ Performans bilgilerini göster",
+        help="Aşama bazında süre, satır sayısı ve tepe bellek kullanımını ölçer"
     )
     
     st.sidebar.markdown("### 📋 Tespit Edilen Tarih Sütunları")
@@ -436,248 +440,379 @@ def main():
     </div>
     """, unsafe_allow_html=True)
     
-    uploaded_file = st.sidebar.file_uploader(
-        "Excel veya CSV dosyasını yükleyin",
+    uploaded_files = st.sidebar.file_uploader(
+        "Excel veya CSV dosyalarını yükleyin",
+        type=['xlsx', 'xls', 'csv'],
+        accept_multiple_files=True,
+        help="Doğalgaz tüketim verilerini içeren dosyaları seçin; ilçe dosyaları ve Excel sayfaları TN'ye göre birleştirilir"
+    )
+    
+    tn_conflict = st.sidebar.selectbox(
+        "Aynı TN çakışma kuralı",
+        list(TN_CONFLICT_LABELS),
+        format_func=lambda rule: TN_CONFLICT_LABELS[rule],
+        help="Aynı tesisatın aynı ayı birden fazla dosyada/sayfada varsa hangi değerin kullanılacağı (dosya adı sırasıyla)"
+    )
+    
+    delta_files = st.sidebar.file_uploader(
+        "🗓️ Yeni ay verileri (isteğe bağlı)",
         type=['xlsx', 'xls', 'csv'],
-        help="Doğalgaz tüketim verilerini içeren dosyayı seçin"
+        accept_multiple_files=True,
+        help="Sadece yeni ayları içeren dosyalar (TN, BN ve yeni ay sütunları); dosya adına göre sırayla eklenir"
     )
     
-    if uploaded_file is not None:
-        if detector.load_data(uploaded_file):
+    if uploaded_files:
+        # Ağır kütüphaneler ve analiz motoru ilk dosya yüklendiğinde içe aktarılır
+        import numpy as np
+        import pandas as pd
+        import plotly.express as px
+        import plotly.graph_objects as go
+        from gas_leak_detector import DETECTORS, REPORT_FORMATS, default_detectors, resolve_detectors
+        
+        # Dedektör seçimi; kayıt analiz motorunda tutulur
+        enabled_detectors = st.sidebar.multiselect(
+            "Çalıştırılacak dedektörler",
+            list(DETECTORS),
+            default=default_detectors(),
+            format_func=lambda name: f"{DETECTORS[name].label} (ağırlık {DETECTORS[name].weight}, maliyet {'●' * DETECTORS[name].cost})",
+            help="Kapatılan dedektörlerin istatistikleri hesaplanmaz ve risk skoruna katılmaz"
+        )
+        quick_scan = st.sidebar.checkbox(
+            "⚡ Hızlı tarama",
+            help="Sadece ucuz dedektörleri çalıştırır (ön eleme için)"
+        )
+        detectors = tuple(
+            detector.name for detector in
+            resolve_detectors(enabled_detectors, QUICK_SCAN_MAX_COST if quick_scan else None)
+        )
+        if not detectors:
+            st.sidebar.warning("⚠️ En az bir dedektör seçin")
+        
+        uploaded_files = sorted(uploaded_files, key=lambda f: f.name)
+        file_hashes = upload_digests(uploaded_files, 'upload_digests')
+        # Tek dosyada da tekrarlanan TN'ler çakışma kuralıyla birleştirildiğinden kural özete dahildir
+        file_hash = hashlib.sha256(':'.join(file_hashes + [tn_conflict]).encode()).hexdigest()
+        
+        # Yükleme ve ön işleme dosya içeriklerine göre önbellekte tutulur
+        detector = load_detector(
+            file_hash, tuple(f.name for f in uploaded_files), uploaded_files, tn_conflict, n_jobs
+        )
+        
+        # Yeni aylar eklenmiş veri, geçmişin ve yeni ay dosyalarının özetleriyle anahtarlanır
+        if detector is not None and delta_files:
+            delta_files = sorted(delta_files, key=lambda f: f.name)
+            delta_hashes = tuple(upload_digests(delta_files, 'delta_digests'))
+            detector = load_updated_detector(
+                file_hash, delta_hashes, tuple(f.name for f in delta_files), delta_files, detector
+            )
+            file_hash = hashlib.sha256(':'.join((file_hash,) + delta_hashes).encode()).hexdigest()
+        if detector is not None:
             st.sidebar.success("✅ Dosya başarıyla yüklendi!")
+            st.sidebar.success("✅ Veri işlendi!")
+            
+            # Veri önizleme
+            st.header("👀 Veri Önizleme")
             
-            # Veri ön işleme
-            if detector.preprocess_data():
-                st.sidebar.success("✅ Veri işlendi!")
+            if st.checkbox("Veri önizlemesini göster"):
+                st.write("**İlk 5 satır:**")
+                st.dataframe(detector.df.head())
                 
-                # Veri önizleme
-                st.header("👀 Veri Önizleme")
+                st.write("**Sütun bilgileri:**")
+                col_info = pd.DataFrame({
+                    'Sütun': detector.df.columns,
+                    'Veri Tipi': detector.df.dtypes,
+                    'Null Değer': detector.df.isnull().sum(),
+                    'Örnek Değer': [str(detector.df[col].iloc[0]) if len(detector.df) > 0 else 'N/A' for col in detector.df.columns]
+                })
+                st.dataframe(col_info)
+            
+            col1, col2, col3, col4 = st.columns(4)
+            
+            with col1:
+                st.markdown(f"""
+                <div class="success-card">
+                    <h3>{len(detector.df)}</h3>
+                    <p>Toplam Tesisat</p>
+                </div>
+                """, unsafe_allow_html=True)
+            
+            with col2:
+                unique_buildings = detector.df['BN'].nunique()
+                st.markdown(f"""
+                <div class="success-card">
+                    <h3>{unique_buildings}</h3>
+                    <p>Toplam Bina</p>
+                </div>
+                """, unsafe_allow_html=True)
+            
+            # Analiz butonu; sonuçlar sonraki etkileşimlerde de gösterilir
+            if st.sidebar.button("🔍 Anomali Analizi Başlat", type="primary"):
+                st.session_state['analyzed_file'] = file_hash
+            
+            if st.session_state.get('analyzed_file') == file_hash:
+                # Analiz arka planda çalışır; önizleme ve özet kartları bu sırada gösterilmeye devam eder
+                analysis_key = (file_hash, low_consumption_threshold, neighbor_ratio_threshold, sudden_drop_threshold,
+                                min_previous_winter, detectors)
+                result = analysis_result(analysis_key, detector, show_performance, n_jobs)
+                if result is None:
+                    st.stop()
                 
-                if st.checkbox("Veri önizlemesini göster"):
-                    st.write("**İlk 5 satır:**")
-                    st.dataframe(detector.df.head())
+                if len(result):
+                    # Sonuç istatistikleri
+                    risk_counts = result.level_counts()
+                    with col3:
+                        high_risk_count = int(risk_counts.get('Yüksek Risk', 0))
+                        st.markdown(f"""
+                        <div class="metric-card">
+                            <h3>{high_risk_count}</h3>
+                            <p>Yüksek Risk</p>
+                        </div>
+                        """, unsafe_allow_html=True)
                     
-                    st.write("**Sütun bilgileri:**")
-                    col_info = pd.DataFrame({
-                        'Sütun': detector.df.columns,
-                        'Veri Tipi': detector.df.dtypes,
-                        'Null Değer': detector.df.isnull().sum(),
-                        'Örnek Değer': [str(detector.df[col].iloc[0]) if len(detector.df) > 0 else 'N/A' for col in detector.df.columns]
-                    })
-                    st.dataframe(col_info)
-                
-                col1, col2, col3, col4 = st.columns(4)
-                
-                with col1:
-                    st.markdown(f"""
-                    <div class="success-card">
-                        <h3>{len(detector.df)}</h3>
-                        <p>Toplam Tesisat</p>
-                    </div>
-                    """, unsafe_allow_html=True)
-                
-                with col2:
-                    unique_buildings = detector.df['BN'].nunique()
-                    st.markdown(f"""
-                    <div class="success-card">
-                        <h3>{unique_buildings}</h3>
-                        <p>Toplam Bina</p>
-                    </div>
-                    """, unsafe_allow_html=True)
-                
-                # Analiz butonu
-                if st.sidebar.button("🔍 Anomali Analizi Başlat", type="primary"):
-                    with st.spinner("Anomali tespiti yapılıyor..."):
-                        suspicious_facilities = detector.detect_anomalies()
+                    with col4:
+                        medium_risk_count = int(risk_counts.get('Orta Risk', 0))
+                        st.markdown(f"""
+                        <div class="warning-card">
+                            <h3>{medium_risk_count}</h3>
+                            <p>Orta Risk</p>
+                        </div>
+                        """, unsafe_allow_html=True)
                     
-                    if suspicious_facilities:
-                        suspicious_df = pd.DataFrame(suspicious_facilities)
-                        
-                        # Sonuç istatistikleri
-                        with col3:
-                            high_risk_count = len(suspicious_df[suspicious_df['Risk_Seviyesi'] == 'Yüksek Risk'])
-                            st.markdown(f"""
-                            <div class="metric-card">
-                                <h3>{high_risk_count}</h3>
-                                <p>Yüksek Risk</p>
-                            </div>
-                            """, unsafe_allow_html=True)
-                        
-                        with col4:
-                            medium_risk_count = len(suspicious_df[suspicious_df['Risk_Seviyesi'] == 'Orta Risk'])
-                            st.markdown(f"""
-                            <div class="warning-card">
-                                <h3>{medium_risk_count}</h3>
-                                <p>Orta Risk</p>
-                            </div>
-                            """, unsafe_allow_html=True)
-                        
-                        # Şüpheli tesisatlar tablosu
-                        st.header("🚨 Şüpheli Tesisatlar")
-                        
-                        # Risk seviyesine göre filtreleme
-                        risk_filter = st.selectbox(
-                            "Risk Seviyesi Filtresi",
-                            ["Tümü", "Yüksek Risk", "Orta Risk", "Düşük Risk"]
+                    # Şüpheli tesisatlar tablosu
+                    st.header("🚨 Şüpheli Tesisatlar")
+                    
+                    # Risk seviyesine göre filtreleme
+                    risk_filter = st.selectbox(
+                        "Risk Seviyesi Filtresi",
+                        ["Tümü", "Yüksek Risk", "Orta Risk", "Düşük Risk"]
+                    )
+                    
+                    level = None if risk_filter == "Tümü" else risk_filter
+                    
+                    # Sadece görünen sayfa tabloya gönderilir
+                    col_search, col_size, col_page = st.columns([2, 1, 1])
+                    with col_search:
+                        table_query = st.text_input("Tesisat No ile ara", key="table_tn_query").strip()
+                    with col_size:
+                        page_size = st.selectbox("Sayfa boyutu", PAGE_SIZES, index=1)
+                    match_count = len(result.search(table_query, level))
+                    page_count = max(1, -(-match_count // page_size))
+                    with col_page:
+                        page_number = st.number_input("Sayfa", min_value=1, max_value=page_count, value=1, step=1)
+                    
+                    offset = (int(page_number) - 1) * page_size
+                    page_positions, match_count = result.page(offset, page_size, level, table_query)
+                    
+                    # Tabloyu göster
+                    st.dataframe(
+                        result.to_frame(page_positions),
+                        use_container_width=True,
+                        height=400
+                    )
+                    if match_count:
+                        st.caption(f"{match_count} kayıttan {offset + 1}-{offset + len(page_positions)} arası gösteriliyor (risk skoruna göre sıralı)")
+                    else:
+                        st.caption("Aramayla eşleşen tesisat bulunamadı")
+                    
+                    # Görselleştirmeler; grafiklere satırlar yerine özet veriler gönderilir
+                    st.header("📊 Görselleştirmeler")
+                    
+                    col1, col2 = st.columns(2)
+                    
+                    with col1:
+                        # Risk seviyesi dağılımı
+                        fig_pie = px.pie(
+                            values=risk_counts.values,
+                            names=risk_counts.index,
+                            title="Risk Seviyesi Dağılımı",
+                            color_discrete_map={
+                                'Yüksek Risk': '#ff6b6b',
+                                'Orta Risk': '#ffa726',
+                                'Düşük Risk': '#66bb6a'
+                            }
                         )
-                        
-                        if risk_filter != "Tümü":
-                            filtered_df = suspicious_df[suspicious_df['Risk_Seviyesi'] == risk_filter]
-                        else:
-                            filtered_df = suspicious_df
-                        
-                        # Tabloyu göster
+                        st.plotly_chart(fig_pie, use_container_width=True)
+                    
+                    with col2:
+                        # Risk skoru dağılımı
+                        score_bins = result.score_histogram(HISTOGRAM_BINS)
+                        fig_hist = go.Figure(go.Bar(
+                            x=(score_bins['Alt_Sınır'] + score_bins['Üst_Sınır']) / 2,
+                            y=score_bins['Tesisat_Sayısı'],
+                            width=score_bins['Üst_Sınır'] - score_bins['Alt_Sınır'],
+                            marker_color='#1f77b4'
+                        ))
+                        fig_hist.update_layout(
+                            title="Risk Skoru Dağılımı",
+                            xaxis_title='Risk_Skoru',
+                            yaxis_title='count',
+                            bargap=0
+                        )
+                        st.plotly_chart(fig_hist, use_container_width=True)
+                    
+                    # Bina bazlı analiz
+                    st.header("🏢 Bina Bazlı Analiz")
+                    
+                    # Rapor tüm binaları içerir, grafik sadece en riskli binaları ve 'Diğer' toplamını
+                    building_analysis = result.building_summary()
+                    
+                    fig_bar = px.bar(
+                        result.top_buildings(CHART_TOP_BUILDINGS),
+                        x='BN',
+                        y='Ortalama_Risk_Skoru',
+                        title=f"Bina Bazlı Ortalama Risk Skoru (en riskli {CHART_TOP_BUILDINGS} bina)",
+                        color='Ortalama_Risk_Skoru',
+                        color_continuous_scale='Reds',
+                        hover_data=['Şüpheli_Tesisat_Sayısı']
+                    )
+                    fig_bar.update_xaxes(type='category')
+                    st.plotly_chart(fig_bar, use_container_width=True)
+
+                    # Bina içi dağılım: tesisat ortalamalarının medyanı, MAD ve yüzdelikleri
+                    with st.expander(f"📐 Bina istatistikleri (en kalabalık {CHART_TOP_BUILDINGS} bina)"):
+                        building_stats = detector.building_statistics()
                         st.dataframe(
-                            filtered_df,
-                            use_container_width=True,
-                            height=400
+                            building_stats.sort_values('Tesisat_Sayısı', ascending=False).head(CHART_TOP_BUILDINGS).round(1),
+                            width='stretch'
                         )
+
+                    # Rapor indirme; dosya sadece indirme istendiğinde üretilir
+                    st.header("📋 Rapor İndirme")
+                    
+                    report_formats = available_report_formats()
+                    if 'xlsx' not in report_formats:
+                        st.warning("⚠️ Excel çıktısı için openpyxl kütüphanesi gerekli. CSV olarak indirebilirsiniz.")
+                    report_format = st.radio(
+                        "Rapor formatı",
+                        report_formats,
+                        format_func=lambda fmt: REPORT_FORMAT_LABELS[fmt],
+                        horizontal=True
+                    )
+                    
+                    # Özet sayfa
+                    summary_df = pd.DataFrame({
+                        'Toplam_Tesisat': [len(detector.df)],
+                        'Şüpheli_Tesisat': [len(result)],
+                        'Yüksek_Risk': [high_risk_count],
+                        'Orta_Risk': [medium_risk_count],
+                        'Düşük_Risk': [int(risk_counts.get('Düşük Risk', 0))],
+                        'Analiz_Tarihi': [datetime.now().strftime('%Y-%m-%d %H:%M:%S')]
+                    })
+                    
+                    report_key = analysis_key
+                    st.download_button(
+                        label=f"📥 {REPORT_FORMAT_LABELS[report_format]} Raporu İndir",
+                        data=functools.partial(
+                            build_report, report_key, report_format, result, summary_df, building_analysis
+                        ),
+                        file_name=f"dogalgaz_anomali_raporu_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{report_format}",
+                        mime=REPORT_FORMATS[report_format],
+                        on_click='ignore'
+                    )
+                    
+                    # Analiz geçmişi; kaydedilen çalıştırmalar detay görünümünde risk geçmişi olarak gösterilir
+                    saved_runs = st.session_state.setdefault('saved_runs', {})
+                    if report_key in saved_runs:
+                        st.caption(f"💾 Bu analiz geçmişe kaydedildi (çalıştırma {saved_runs[report_key]})")
+                    elif st.button("💾 Analiz geçmişine kaydet"):
+                        with st.spinner("Analiz kaydediliyor..."):
+                            saved_runs[report_key] = result_store().save_run(file_hash, detector, result, report_key[1:5])
+                        st.success(f"✅ Analiz geçmişe kaydedildi (çalıştırma {saved_runs[report_key]})")
+                    
+                    # Detaylı analiz
+                    st.header("🔍 Detaylı Analiz")
+                    
+                    # Arama yoksa en riskli tesisatlar, varsa eşleşenler listelenir
+                    picker_query = st.text_input("Tesisat No ile ara", key="picker_tn_query").strip()
+                    if picker_query:
+                        picker_positions = result.search(picker_query)[:PICKER_LIMIT]
+                        # Tam eşleşen TN indeksten bulunur ve listenin başına alınır
+                        exact_position = result.position(picker_query)
+                        if exact_position is not None:
+                            picker_positions = np.concatenate([
+                                [exact_position], picker_positions[picker_positions != exact_position]
+                            ])
+                        elif detector.facility_row(picker_query) is not None:
+                            st.info(f"Tesisat {picker_query} bu analizde şüpheli bulunmadı")
+                            st.plotly_chart(
+                                consumption_chart(detector, detector.facility_row(picker_query), picker_query),
+                                width='stretch'
+                            )
+                    else:
+                        picker_positions = result.top_k(PICKER_LIMIT)
+                    if len(result) > len(picker_positions):
+                        st.caption(f"En fazla {PICKER_LIMIT} tesisat listelenir; diğerleri için Tesisat No ile arayın")
+                    
+                    selected_position = st.selectbox(
+                        "Detayını görmek istediğiniz tesisatı seçin:",
+                        options=picker_positions.tolist(),
+                        format_func=lambda position: f"Tesisat {result.tn[position]}"
+                    )
+                    
+                    if selected_position is not None:
+                        selected_facility = result.tn[selected_position]
+                        facility_data = result.to_frame([selected_position]).iloc[0]
                         
-                        # Görselleştirmeler
-                        st.header("📊 Görselleştirmeler")
+                        st.subheader(f"Tesisat {selected_facility} - Detaylı Analiz")
                         
-                        col1, col2 = st.columns(2)
+                        col1, col2, col3 = st.columns(3)
                         
                         with col1:
-                            # Risk seviyesi dağılımı
-                            risk_counts = suspicious_df['Risk_Seviyesi'].value_counts()
-                            fig_pie = px.pie(
-                                values=risk_counts.values,
-                                names=risk_counts.index,
-                                title="Risk Seviyesi Dağılımı",
-                                color_discrete_map={
-                                    'Yüksek Risk': '#ff6b6b',
-                                    'Orta Risk': '#ffa726',
-                                    'Düşük Risk': '#66bb6a'
-                                }
-                            )
-                            st.plotly_chart(fig_pie, use_container_width=True)
+                            st.metric("Risk Skoru", f"{facility_data['Risk_Skoru']:.0f}")
                         
                         with col2:
-                            # Risk skoru dağılımı
-                            fig_hist = px.histogram(
-                                suspicious_df,
-                                x='Risk_Skoru',
-                                title="Risk Skoru Dağılımı",
-                                nbins=20,
-                                color_discrete_sequence=['#1f77b4']
-                            )
-                            st.plotly_chart(fig_hist, use_container_width=True)
-                        
-                        # Bina bazlı analiz
-                        st.header("🏢 Bina Bazlı Analiz")
-                        
-                        building_analysis = suspicious_df.groupby('BN').agg({
-                            'TN': 'count',
-                            'Risk_Skoru': 'mean'
-                        }).rename(columns={'TN': 'Şüpheli_Tesisat_Sayısı', 'Risk_Skoru': 'Ortalama_Risk_Skoru'})
+                            st.metric("Risk Seviyesi", facility_data['Risk_Seviyesi'])
                         
-                        building_analysis = building_analysis.sort_values('Ortalama_Risk_Skoru', ascending=False)
-                        
-                        fig_bar = px.bar(
-                            building_analysis.reset_index(),
-                            x='BN',
-                            y='Ortalama_Risk_Skoru',
-                            title="Bina Bazlı Ortalama Risk Skoru",
-                            color='Ortalama_Risk_Skoru',
-                            color_continuous_scale='Reds'
-                        )
-                        st.plotly_chart(fig_bar, use_container_width=True)
-                        
-                        # Excel raporu indirme
-                        st.header("📋 Rapor İndirme")
+                        with col3:
+                            st.metric("Ortalama Tüketim", f"{facility_data['Ortalama_Tuketim']:.1f} m³")
                         
-                        # Rapor oluşturma
-                        with st.spinner("Rapor hazırlanıyor..."):
-                            # Ana rapor
-                            report_data = suspicious_df.copy()
-                            
-                            # Özet sayfa
-                            summary_data = {
-                                'Toplam_Tesisat': [len(detector.df)],
-                                'Şüpheli_Tesisat': [len(suspicious_df)],
-                                'Yüksek_Risk': [high_risk_count],
-                                'Orta_Risk': [medium_risk_count],
-                                'Düşük_Risk': [len(suspicious_df[suspicious_df['Risk_Seviyesi'] == 'Düşük Risk'])],
-                                'Analiz_Tarihi': [datetime.now().strftime('%Y-%m-%d %H:%M:%S')]
-                            }
-                            summary_df = pd.DataFrame(summary_data)
-                            
-                            # Excel dosyası oluştur
-                            output = io.BytesIO()
-                            
-                            try:
-                                with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                                    summary_df.to_excel(writer, sheet_name='Özet', index=False)
-                                    report_data.to_excel(writer, sheet_name='Şüpheli_Tesisatlar', index=False)
-                                    building_analysis.to_excel(writer, sheet_name='Bina_Analizi', index=True)
-                                output.seek(0)
-                            except ImportError:
-                                st.warning("⚠️ Excel çıktısı için openpyxl kütüphanesi gerekli. CSV olarak indiriliyor.")
-                                # CSV alternatifi
-                                csv_output = report_data.to_csv(index=False)
-                                st.download_button(
-                                    label="📥 CSV Raporu İndir",
-                                    data=csv_output,
-                                    file_name=f"dogalgaz_anomali_raporu_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                                    mime="text/csv"
+                        # Binadaki konum (komşu veya bina içi aykırı değer dedektörü çalıştıysa)
+                        if np.isfinite(facility_data['Bina_Yüzdelik_Sırası']):
+                            building_z = facility_data['Bina_Z_Skoru']
+                            col_z, col_rank = st.columns(2)
+                            with col_z:
+                                st.metric(
+                                    "Bina İçi Z-Skoru",
+                                    f"{building_z:.2f}" if np.isfinite(building_z) else "—",
+                                    help="Bina medyanı ve MAD ile robust z-skoru; 5'ten az tesisatlı binalarda hesaplanmaz"
                                 )
-                                output = None
+                            with col_rank:
+                                st.metric("Bina İçi Yüzdelik Sıra", f"%{facility_data['Bina_Yüzdelik_Sırası']:.0f}")
                         
-                        if output:
-                            st.download_button(
-                                label="📥 Excel Raporu İndir",
-                                data=output.getvalue(),
-                                file_name=f"dogalgaz_anomali_raporu_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-                                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                            )
-                        
-                        # Detaylı analiz
-                        st.header("🔍 Detaylı Analiz")
+                        st.write("**Tespit Edilen Anomaliler:**")
+                        st.write(facility_data['Anomaliler'])
                         
-                        selected_facility = st.selectbox(
-                            "Detayını görmek istediğiniz tesisatı seçin:",
-                            options=suspicious_df['TN'].tolist(),
-                            format_func=lambda x: f"Tesisat {x}"
+                        # Tüketim grafiği; satır konumu sonuçta tutulduğundan tablo taranmaz
+                        st.plotly_chart(
+                            consumption_chart(detector, result.rows[selected_position], selected_facility),
+                            use_container_width=True
                         )
                         
-                        if selected_facility:
-                            facility_data = suspicious_df[suspicious_df['TN'] == selected_facility].iloc[0]
-                            
-                            st.subheader(f"Tesisat {selected_facility} - Detaylı Analiz")
-                            
-                            col1, col2, col3 = st.columns(3)
-                            
-                            with col1:
-                                st.metric("Risk Skoru", f"{facility_data['Risk_Skoru']:.0f}")
-                            
-                            with col2:
-                                st.metric("Risk Seviyesi", facility_data['Risk_Seviyesi'])
-                            
-                            with col3:
-                                st.metric("Ortalama Tüketim", f"{facility_data['Ortalama_Tuketim']:.1f} m³")
-                            
-                            st.write("**Tespit Edilen Anomaliler:**")
-                            st.write(facility_data['Anomaliler'])
-                            
-                            # Tüketim grafiği
-                            facility_consumption = detector.df[detector.df['TN'] == selected_facility]
-                            if not facility_consumption.empty:
-                                date_columns = [col for col in detector.df.columns if any(year in str(col) for year in range(2016, 2026))]
-                                consumption_values = facility_consumption[date_columns].values[0]
-                                
-                                fig_line = px.line(
-                                    x=date_columns,
-                                    y=consumption_values,
-                                    title=f"Tesisat {selected_facility} - Tüketim Grafiği",
-                                    labels={'x': 'Tarih', 'y': 'Tüketim (m³)'}
-                                )
-                                fig_line.update_layout(xaxis_tickangle=-45)
-                                st.plotly_chart(fig_line, use_container_width=True)
-                    
-                    else:
-                        st.success("🎉 Herhangi bir şüpheli tesisat tespit edilmedi!")
-    
+                        # Kaydedilmiş çalıştırmalardaki risk geçmişi
+                        risk_history = result_store().risk_history(selected_facility)
+                        if len(risk_history) > 1:
+                            fig_history = px.line(
+                                risk_history,
+                                x='run_date',
+                                y='risk_score',
+                                markers=True,
+                                hover_data=['risk_level', 'low_threshold', 'neighbor_threshold', 'drop_threshold', 'min_previous_winter'],
+                                title=f"Tesisat {selected_facility} - Risk Geçmişi",
+                                labels={'run_date': 'Analiz Tarihi', 'risk_score': 'Risk Skoru'}
+                            )
+                            st.plotly_chart(fig_history, width='stretch')
+                
+                else:
+                    st.success("🎉 Herhangi bir şüpheli tesisat tespit edilmedi!")
+                
+                # Performans bölümü: bu analizin ve dosyanın yüklenmesinin aşamaları
+                if show_performance:
+                    with st.expander("⏱️ Performans"):
+                        st.write("**Analiz**")
+                        st.dataframe(performance_table(result.performance), width='stretch')
+                        st.write("**Dosya yükleme ve ön işleme**")
+                        st.dataframe(performance_table(detector.load_performance), width='stretch')
+
     else:
         st.info("👆 Lütfen sol panelden Excel dosyanızı yükleyin.")
         
@@ -0,0 +1,241 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from gas_leak_detector import GasLeakDetector
+
+# Bu süreden kısa aşamalarda gerileme kontrolü yapılmaz (ölçüm gürültüsü)
+MIN_REGRESSION_SECONDS = 0.05
+
+# Satır bazlı yardımcılar bu kadar tesisat üzerinde ölçülür
+HELPER_SAMPLE_ROWS = 1000
+
+# Açılış ölçümü: boş karşılama sayfası bu kadar kez yeniden çalıştırılır
+STARTUP_RERUNS = 5
+
+# Açılış ölçümü temiz bir yorumlayıcıda çalışır; ilk çalıştırma uygulamanın
+# tüm içe aktarmalarını içerir (streamlit hariç)
+STARTUP_SCRIPT = """
+import json, time
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file({path!r}, default_timeout=60)
+started = time.perf_counter()
+app.run()
+first_run = time.perf_counter() - started
+started = time.perf_counter()
+for _ in range({reruns}):
+    app.run()
+rerun = (time.perf_counter() - started) / {reruns}
+print(json.dumps({{'first_run': first_run, 'rerun': rerun}}))
+"""
+
+def generate_consumption_data(n_facilities, mean_building_size=8, max_building_size=300,
+                              start_year=2016, end_year=2025, theft_ratio=0.03,
+                              zero_ratio=0.02, decline_ratio=0.02, seed=0):
+    """Sentetik aylık tüketim verisi üret
+
+    Bina büyüklükleri log-normal dağılır (çoğu küçük, az sayıda 200+ sayaçlı blok).
+    Tüketim kışın yüksek, yazın düşük mevsimsel bir eğri izler. Tesisatların bir
+    kısmına hırsızlık (kalıcı ani düşüş), sıfır tüketim dönemi ve sürekli azalan
+    trend desenleri enjekte edilir; hangi desenin eklendiği 'Enjekte_Desen'
+    sütununda tutulur.
+    """
+    rng = np.random.default_rng(seed)
+    columns = [f"{year}/{month}" for year in range(start_year, end_year + 1) for month in range(1, 13)]
+    n_months = len(columns)
+
+    # Bina numaraları: log-normal büyüklüklerle ardışık bloklar
+    sizes = []
+    remaining = n_facilities
+    while remaining > 0:
+        size = int(np.clip(rng.lognormal(np.log(mean_building_size), 1.0), 1, max_building_size))
+        sizes.append(min(size, remaining))
+        remaining -= sizes[-1]
+    buildings = np.repeat(np.arange(1, len(sizes) + 1), sizes)
+
+    # Mevsimsel tüketim: ocakta en yüksek, temmuzda en düşük
+    months = np.arange(n_months) % 12
+    season = 1 + 0.8 * np.cos(months / 12 * 2 * np.pi)
+    base = rng.gamma(4, 25, size=(n_facilities, 1)).astype(np.float32)
+    data = base * season.astype(np.float32) * rng.uniform(0.8, 1.2, size=(n_facilities, n_months)).astype(np.float32)
+
+    # Desen enjeksiyonu
+    pattern = np.full(n_facilities, 'normal', dtype=object)
+    draw = rng.random(n_facilities)
+    start = rng.integers(n_months // 4, n_months - 12, size=n_facilities)
+    after_start = np.arange(n_months) >= start[:, None]
+
+    theft = draw < theft_ratio
+    data[theft] = np.where(after_start[theft], data[theft] * rng.uniform(0.1, 0.3), data[theft])
+    pattern[theft] = 'hirsizlik'
+
+    zero = (draw >= theft_ratio) & (draw < theft_ratio + zero_ratio)
+    zero_window = after_start & (np.arange(n_months) < start[:, None] + 6)
+    data[zero] = np.where(zero_window[zero], 0, data[zero])
+    pattern[zero] = 'sifir_tuketim'
+
+    decline = (draw >= theft_ratio + zero_ratio) & (draw < theft_ratio + zero_ratio + decline_ratio)
+    ramp = np.clip(1 - (np.arange(n_months) - (n_months - 24)) / 24, 0.05, 1).astype(np.float32)
+    data[decline] = data[decline] * ramp
+    pattern[decline] = 'azalan_trend'
+
+    df = pd.DataFrame(np.round(data), columns=columns)
+    df.insert(0, 'TN', np.arange(1, n_facilities + 1) + 1_000_000)
+    df.insert(1, 'BN', buildings)
+    df['Enjekte_Desen'] = pattern
+    return df
+
+def measure_time(func):
+    """Fonksiyonu çalıştır; süreyi (sn) döndür"""
+    started = time.perf_counter()
+    func()
+    return time.perf_counter() - started
+
+def measure_memory(func):
+    """Fonksiyonu tracemalloc altında çalıştır; tepe belleği (MB) döndür
+    
+    tracemalloc her bellek ayırmayı izlediğinden süre ölçümüyle aynı geçişte kullanılmaz.
+    """
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / 1024 ** 2
+
+def pipeline_stages(detector, path):
+    """Ölçülen hat aşamaları; her tekrar yeni bir dedektörle baştan çalıştırılır"""
+    return [
+        ('load_files', lambda: detector.load_files([path])),
+        ('preprocess_data', detector.preprocess_data),
+        ('facility_stats', detector._compute_facility_stats),
+        ('drop_counts', lambda: detector._drop_counts(70)),
+        ('detect_anomalies', lambda: detector.detect_anomalies_frame(30, 60, 70)),
+    ]
+
+def run_size(n_facilities, args):
+    """Tek bir veri boyutu için tüm aşamaları ölç
+    
+    Süre, args.repeats tekrarın en kısasıdır; tepe bellek ayrı bir geçişte ölçülür.
+    """
+    df = generate_consumption_data(n_facilities, seed=args.seed)
+    results = {}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'benchmark.csv')
+        df.to_csv(path, index=False)
+        del df
+
+        timings = {}
+        for _ in range(args.repeats):
+            for name, func in pipeline_stages(GasLeakDetector(n_jobs=args.jobs), path):
+                timings.setdefault(name, []).append(measure_time(func))
+        
+        detector = GasLeakDetector(n_jobs=args.jobs)
+        for name, func in pipeline_stages(detector, path):
+            elapsed = min(timings[name])
+            results[name] = {'seconds': elapsed, 'peak_mb': measure_memory(func), 'rows_per_sec': n_facilities / max(elapsed, 1e-9)}
+
+    # Satır bazlı _detect_* yardımcıları: örnek tesisatlar üzerinde tesisat başına hız
+    date_columns = detector.schema.columns
+    sample = detector.df.head(HELPER_SAMPLE_ROWS)
+    sample_rows = [(row['BN'], row['TN'], row[date_columns].to_numpy(dtype=np.float64)) for _, row in sample.iterrows()]
+    helpers = [
+        ('_detect_sudden_drops', lambda bn, tn, data: detector._detect_sudden_drops(data, 70)),
+        ('_detect_zero_consumption', lambda bn, tn, data: detector._detect_zero_consumption(data)),
+        ('_detect_low_consumption', lambda bn, tn, data: detector._detect_low_consumption(data, 30)),
+        ('_detect_trend_anomaly', lambda bn, tn, data: detector._detect_trend_anomaly(data)),
+        ('_detect_seasonal_anomaly', lambda bn, tn, data: detector._detect_seasonal_anomaly(data)),
+        ('_compare_with_neighbors', lambda bn, tn, data: detector._compare_with_neighbors(bn, tn, data, 60)),
+        ('_detect_winter_drops', lambda bn, tn, data: detector._detect_winter_drops(data, 70, 100)),
+        ('_compare_with_building', lambda bn, tn, data: detector._compare_with_building(bn, data)),
+    ]
+    for name, helper in helpers:
+        run = lambda: [helper(*row) for row in sample_rows]
+        elapsed = min(measure_time(run) for _ in range(args.repeats))
+        results[name] = {'seconds': elapsed, 'peak_mb': measure_memory(run), 'rows_per_sec': len(sample_rows) / max(elapsed, 1e-9)}
+
+    return results
+
+def run_startup(app_path):
+    """Arayüzün boş karşılama sayfasında ilk (soğuk) ve sonraki çalıştırma süreleri"""
+    script = STARTUP_SCRIPT.format(path=os.path.abspath(app_path), reruns=STARTUP_RERUNS)
+    completed = subprocess.run(
+        [sys.executable, '-c', script], cwd=os.path.dirname(os.path.abspath(app_path)),
+        capture_output=True, text=True, check=True
+    )
+    timings = json.loads(completed.stdout.strip().splitlines()[-1])
+    return {name: {'seconds': seconds} for name, seconds in timings.items()}
+
+def compare_with_baseline(results, baseline, tolerance):
+    """Taban çizgisine göre toleranstan fazla yavaşlayan aşamaları döndür"""
+    regressions = []
+    for size, stages in results.items():
+        for name, current in stages.items():
+            reference = baseline.get(size, {}).get(name)
+            if reference is None:
+                continue
+            limit = reference['seconds'] * (1 + tolerance)
+            if current['seconds'] > limit and current['seconds'] - reference['seconds'] > MIN_REGRESSION_SECONDS:
+                regressions.append((size, name, reference['seconds'], current['seconds']))
+    return regressions
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Anomali tespit hattı için performans ölçümü")
+    parser.add_argument('--sizes', type=int, nargs='*', default=[10_000, 100_000, 1_000_000], help="Tesisat sayıları")
+    parser.add_argument('--seed', type=int, default=0, help="Sentetik veri tohumu")
+    parser.add_argument('-j', '--jobs', type=int, default=1, help="Paralel işlem sayısı")
+    parser.add_argument('--repeats', type=int, default=3, help="Süre ölçümü tekrar sayısı (en kısası kullanılır)")
+    parser.add_argument('--baseline', default='benchmark_baseline.json', help="Taban çizgisi dosyası")
+    parser.add_argument('--startup', nargs='?', const='app2.py', metavar='UYGULAMA',
+                        help="Arayüzün açılış süresini de ölç (varsayılan: app2.py)")
+    parser.add_argument('--save-baseline', action='store_true', help="Sonuçları taban çizgisi olarak kaydet")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="İzin verilen yavaşlama oranı (0.25 = %%25)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    results = {}
+    for n_facilities in args.sizes:
+        results[str(n_facilities)] = run_size(n_facilities, args)
+        print(f"\n{n_facilities:,} tesisat")
+        print(f"{'Aşama':<28}{'Süre (sn)':>12}{'Tepe (MB)':>12}{'Tesisat/sn':>16}")
+        for name, stage in results[str(n_facilities)].items():
+            print(f"{name:<28}{stage['seconds']:>12.3f}{stage['peak_mb']:>12.1f}{stage['rows_per_sec']:>16,.0f}")
+    
+    if args.startup:
+        results['startup'] = run_startup(args.startup)
+        print(f"\nAçılış ({args.startup}, boş sayfa)")
+        print(f"{'Aşama':<28}{'Süre (sn)':>12}")
+        for name, stage in results['startup'].items():
+            print(f"{name:<28}{stage['seconds']:>12.3f}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nTaban çizgisi kaydedildi: {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\nTaban çizgisi bulunamadı ({args.baseline}), karşılaştırma atlandı")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare_with_baseline(results, baseline, args.tolerance)
+    for size, name, before, after in regressions:
+        print(f"GERİLEME: {size} tesisat, {name}: {before:.3f} sn -> {after:.3f} sn")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
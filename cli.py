@@ -0,0 +1,138 @@
+import argparse
+import hashlib
+import logging
+import os
+import sys
+
+import pandas as pd
+
+from gas_leak_detector import DETECTORS, REPORT_FORMATS, TN_CONFLICT_RULES, GasLeakDetector, default_detectors, file_hash, resolve_detectors, write_report
+from results_store import ResultStore
+
+SUPPORTED_EXTENSIONS = ('.xlsx', '.xls', '.csv')
+
+def find_input_files(paths):
+    """Verilen dosya ve dizinlerden desteklenen tüm dosyaları topla"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.endswith(SUPPORTED_EXTENSIONS):
+                    files.append(os.path.join(path, name))
+        else:
+            files.append(path)
+    return files
+
+def analyze_file(path, args):
+    """Tek bir dosyayı analiz et ve şüpheli tesisat raporunu yaz"""
+    return analyze([path], os.path.splitext(os.path.basename(path))[0], args)
+
+def analyze(paths, stem, args):
+    """Dosyaları (birden fazlaysa TN'ye göre birleştirerek) analiz et ve raporu yaz"""
+    name = ', '.join(paths)
+    profile_path = os.path.join(args.profile_dir, f"{stem}.prof") if args.profile_dir else None
+    detector = GasLeakDetector(n_jobs=args.jobs, track_memory=args.timings, profile_path=profile_path)
+    
+    dataset_hash = None
+    if not args.no_cache or args.store:
+        # Tek dosyada da tekrarlanan TN'ler çakışma kuralıyla birleştirilir
+        dataset_hash = hashlib.sha256(':'.join([file_hash(path) for path in paths] + [args.tn_conflict]).encode()).hexdigest()
+    digest = None if args.no_cache else dataset_hash
+    
+    if digest is not None and detector.load_cache(digest) and detector.preprocess_data():
+        logging.info("Önbellekten yüklendi: %s", name)
+    elif detector.load_files(paths, args.tn_conflict) and detector.preprocess_data():
+        if digest is not None:
+            detector.save_cache(digest)
+    else:
+        return None
+    
+    # Saklanan istatistikler varsa geçmiş yeniden analiz edilmez
+    if digest is not None:
+        detector.load_stats(digest)
+    
+    # Yeni aylar sadece birikimli istatistikler üzerinden eklenir
+    if args.delta:
+        if digest is not None:
+            detector.save_stats(digest)
+        for delta_path in args.delta:
+            if not detector.apply_delta(delta_path):
+                logging.error("%s eklenemedi: %s", delta_path, detector.load_error)
+                return None
+    
+    detectors = [item.name for item in resolve_detectors(args.detectors, args.max_cost)]
+    result = detector.detect_anomalies_result(args.low, args.neighbor, args.drop, args.min_winter,
+                                              detectors=detectors, track_memory=args.timings)
+    if digest is not None and not args.delta:
+        detector.save_stats(digest)
+    
+    if args.store:
+        # Yeni aylar eklenmiş veri kümesi ayrı bir özetle saklanır
+        if args.delta:
+            dataset_hash = hashlib.sha256(':'.join([dataset_hash] + [file_hash(path) for path in args.delta]).encode()).hexdigest()
+        with result.performance.stage('store', len(result)):
+            run_id = ResultStore(args.store).save_run(dataset_hash, detector, result, (args.low, args.neighbor, args.drop, args.min_winter))
+        logging.info("Analiz geçmişe kaydedildi: %s (çalıştırma %d)", args.store, run_id)
+    
+    output_path = os.path.join(args.output_dir, f"{stem}_anomali_raporu.{args.format}")
+    with result.performance.stage('report', len(result)):
+        write_report(result, output_path, args.format)
+    
+    logging.info("%s: %d tesisat, %d şüpheli -> %s", name, len(detector.df), len(result), output_path)
+    if args.timings:
+        timings = pd.concat([detector.load_performance.to_frame(), result.performance.to_frame()], ignore_index=True)
+        print(timings.to_string(index=False))
+    return output_path
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Doğalgaz tüketim anomali tespiti (Streamlit olmadan toplu çalıştırma)"
+    )
+    parser.add_argument('inputs', nargs='+', help="Excel/CSV dosyaları veya bu dosyaları içeren dizinler")
+    parser.add_argument('-o', '--output-dir', default='.', help="Raporların yazılacağı dizin")
+    parser.add_argument('--format', choices=list(REPORT_FORMATS), default='csv', help="Rapor formatı (parquet için pyarrow gerekir)")
+    parser.add_argument('--low', type=float, default=30, help="Düşük tüketim eşiği (m³/ay)")
+    parser.add_argument('--neighbor', type=float, default=60, help="Bina ortalamasından düşük olma oranı (%%)")
+    parser.add_argument('--drop', type=float, default=70, help="Ani düşüş oranı (%%)")
+    parser.add_argument('--min-winter', type=float, default=100, help="Kış düşüşü için önceki kışın en az aylık ortalaması (m³)")
+    parser.add_argument('--detectors', nargs='+', choices=list(DETECTORS), metavar='DEDEKTÖR',
+                        help=f"Çalıştırılacak dedektörler (varsayılan: {', '.join(default_detectors())}): {', '.join(DETECTORS)}")
+    parser.add_argument('--max-cost', type=int, choices=(1, 2, 3),
+                        help="Sadece bu maliyete kadar olan dedektörleri çalıştır (1: hızlı tarama)")
+    parser.add_argument('-j', '--jobs', type=int, default=1, help="Paralel işlem sayısı")
+    parser.add_argument('--no-cache', action='store_true', help="Disk önbelleğini kullanma")
+    parser.add_argument('--merge', metavar='AD', help="Tüm dosyaları TN'ye göre birleştirip tek rapor yaz (rapor adı)")
+    parser.add_argument('--tn-conflict', choices=TN_CONFLICT_RULES, default='last',
+                        help="Aynı TN'nin aynı ayı birden fazla kaynakta varsa: last, first veya max")
+    parser.add_argument('--delta', nargs='+', default=[], help="Sadece yeni ayları içeren dosyalar (sırayla eklenir)")
+    parser.add_argument('--store', nargs='?', const=ResultStore.DEFAULT_PATH, metavar='YOL',
+                        help=f"Sonuçları analiz geçmişi veritabanına kaydet (varsayılan: {ResultStore.DEFAULT_PATH})")
+    parser.add_argument('--timings', action='store_true', help="Aşama bazında süre ve bellek tablosunu yazdır")
+    parser.add_argument('--profile-dir', help="Her dosya için cProfile çıktısının yazılacağı dizin")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    
+    files = find_input_files(args.inputs)
+    if not files:
+        logging.error("Analiz edilecek dosya bulunamadı")
+        return 1
+    if args.delta and len(files) > 1 and not args.merge:
+        logging.error("--delta sadece tek bir geçmiş dosyasıyla kullanılabilir")
+        return 1
+    
+    os.makedirs(args.output_dir, exist_ok=True)
+    if args.profile_dir:
+        os.makedirs(args.profile_dir, exist_ok=True)
+    if args.merge:
+        failed = [] if analyze(files, args.merge, args) is not None else files
+    else:
+        failed = [path for path in files if analyze_file(path, args) is None]
+    for path in failed:
+        logging.error("Analiz başarısız: %s", path)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
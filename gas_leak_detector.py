@@ -0,0 +1,2145 @@
+import copy
+import cProfile
+import functools
+import hashlib
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+from contextlib import contextmanager, nullcontext
+from datetime import date
+from functools import lru_cache
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+def file_hash(path, block_size=1 << 20):
+    """Dosya içeriğinin SHA-256 özeti (önbellek anahtarı)"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class PerformanceLog:
+    """Aşama bazında süre, satır sayısı ve tepe bellek kayıtları
+    
+    track_memory açıksa en dış aşamaların tepe belleği tracemalloc ile ölçülür;
+    profile_path verilirse en dış aşamalar cProfile ile profillenip bu dosyaya yazılır.
+    """
+    MAX_RECORDS = 500
+    
+    def __init__(self, track_memory=False, profile_path=None):
+        self.track_memory = track_memory
+        self.profile_path = profile_path
+        self.records = deque(maxlen=self.MAX_RECORDS)
+        self._depth = 0
+        self._profiler = None
+    
+    @contextmanager
+    def stage(self, name, rows=None):
+        """Bir aşamayı ölç; iç içe aşamalar düzey bilgisiyle kaydedilir"""
+        record = {'Aşama': name, 'Düzey': self._depth, 'Süre_sn': None,
+                  'Satır_Sayısı': rows, 'Tepe_Bellek_MB': None}
+        outermost = self._depth == 0
+        tracing = outermost and self.track_memory and not tracemalloc.is_tracing()
+        profiling = outermost and self.profile_path is not None
+        if tracing:
+            tracemalloc.start()
+        if profiling:
+            self._profiler = self._profiler or cProfile.Profile()
+            self._profiler.enable()
+        
+        # Kayıt başta eklenir, böylece tabloda dış aşama iç aşamalarından önce görünür
+        self.records.append(record)
+        self._depth += 1
+        started = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['Süre_sn'] = time.perf_counter() - started
+            self._depth -= 1
+            if profiling:
+                self._profiler.disable()
+                self._profiler.dump_stats(self.profile_path)
+            if tracing:
+                record['Tepe_Bellek_MB'] = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+                tracemalloc.stop()
+    
+    def add_totals(self, other):
+        """Başka bir kaydın aşamalarını ada göre toplayıp bu kayda iç aşamalar olarak ekle
+        
+        Blok blok ölçülen aşamalar (aynı ad birden çok kez) tek satırda toplanır;
+        süre ve satır sayısı bloklar üzerinden toplanır.
+        """
+        totals = {}
+        for record in other.records:
+            total = totals.setdefault(record['Aşama'], dict(record, **{'Süre_sn': 0.0, 'Satır_Sayısı': 0}))
+            total['Süre_sn'] += record['Süre_sn'] or 0.0
+            total['Satır_Sayısı'] += record['Satır_Sayısı'] or 0
+        for total in totals.values():
+            total['Düzey'] += self._depth
+            self.records.append(total)
+    
+    def to_frame(self):
+        """Kayıtları DataFrame olarak döndür"""
+        return pd.DataFrame(list(self.records), columns=['Aşama', 'Düzey', 'Süre_sn', 'Satır_Sayısı', 'Tepe_Bellek_MB'])
+
+def _stage(performance, name, rows=None):
+    """performance verilmişse aşamayı ölç, yoksa hiçbir şey yapma"""
+    return performance.stage(name, rows) if performance is not None else nullcontext({})
+
+def _timed(stage_name):
+    """Metodun süresini ve işlenen satır sayısını self.performance'a kaydet"""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.performance.stage(stage_name) as record:
+                result = method(self, *args, **kwargs)
+                record['Satır_Sayısı'] = len(self.df) if self.df is not None else 0
+            return result
+        return wrapper
+    return decorator
+
+TURKISH_MONTHS = {
+    'ocak': 1, 'şubat': 2, 'subat': 2, 'mart': 3, 'nisan': 4, 'mayıs': 5, 'mayis': 5,
+    'haziran': 6, 'temmuz': 7, 'ağustos': 8, 'agustos': 8, 'eylül': 9, 'eylul': 9,
+    'ekim': 10, 'kasım': 11, 'kasim': 11, 'aralık': 12, 'aralik': 12,
+}
+
+WINTER_MONTHS = (12, 1, 2)
+SUMMER_MONTHS = (6, 7, 8)
+
+def parse_period(column):
+    """Sütun adını (yıl, ay) çiftine çevir; tüketim sütunu değilse None
+    
+    Desteklenen biçimler: 2016/1, 2016-01, 2016.01, 201601, 01/2016, Ocak 2016
+    ve Excel'in tarih olarak okuduğu başlıklar.
+    """
+    if isinstance(column, (date, pd.Timestamp)):
+        return column.year, column.month
+    
+    text = str(column).strip().lower()
+    year = month = None
+    match = (re.match(r'^(\d{4})[-/._ ](\d{1,2})(?!\d)', text) or
+             re.match(r'^(\d{4})(\d{2})$', text))
+    if match:
+        year, month = int(match.group(1)), int(match.group(2))
+    else:
+        match = re.match(r'^(\d{1,2})[-/._ ](\d{4})(?!\d)', text)
+        if match:
+            month, year = int(match.group(1)), int(match.group(2))
+        else:
+            match = re.search(r'(\d{4})', text)
+            names = [number for name, number in TURKISH_MONTHS.items() if name in text]
+            if match and names:
+                year, month = int(match.group(1)), names[0]
+    
+    if year is None or not (1900 <= year <= 2100 and 1 <= month <= 12):
+        return None
+    return year, month
+
+class ColumnSchema:
+    """Tüketim sütunlarının kronolojik (yıl, ay) eşlemesi
+    
+    Yükleme sırasında bir kez kurulur; dedektörler sütun aramak yerine buradaki
+    hazır indeks dizilerini kullanır.
+    """
+    def __init__(self, columns):
+        entries = []
+        for position, column in enumerate(columns):
+            period = parse_period(column)
+            if period is not None:
+                entries.append((period, position, column))
+        entries.sort()
+        
+        self.columns = [column for _, _, column in entries]
+        self.periods = [period for period, _, _ in entries]
+        self.years = np.array([year for year, _ in self.periods], dtype=np.int32)
+        self.months = np.array([month for _, month in self.periods], dtype=np.int32)
+        self.winter_idx = np.flatnonzero(np.isin(self.months, WINTER_MONTHS))
+        self.summer_idx = np.flatnonzero(np.isin(self.months, SUMMER_MONTHS))
+        
+        # Tam kışlar (Aralık ve sonraki yılın Ocak, Şubat ayları): kış x 3 sütun indeksi,
+        # kış yılı Ocak ayının yılıdır
+        positions = {}
+        for position, period in enumerate(self.periods):
+            positions.setdefault(period, position)
+        winters = []
+        for year in sorted(set(self.years.tolist())):
+            season = [positions.get((year - 1, 12)), positions.get((year, 1)), positions.get((year, 2))]
+            if None not in season:
+                winters.append((year, season))
+        self.winter_years = np.array([year for year, _ in winters], dtype=np.int32)
+        self.winter_seasons = np.array([season for _, season in winters], dtype=np.intp).reshape(-1, 3)
+    
+    def __len__(self):
+        return len(self.columns)
+    
+    def last(self, n):
+        """Son n ayın sütun aralığı (kopyasız dilim)"""
+        return slice(max(len(self.columns) - n, 0), len(self.columns))
+    
+    def first(self, n):
+        """İlk n ayın sütun aralığı (kopyasız dilim)"""
+        return slice(0, min(n, len(self.columns)))
+    
+    def labels(self):
+        """Grafikler için YYYY/AA etiketleri"""
+        return [f"{year}/{month:02d}" for year, month in self.periods]
+
+class Detector:
+    """Kayıtlı bir anomali dedektörü
+    
+    kernel(inputs, thresholds) tüm tesisatlar için tetiklenme sayısını (bool
+    veya tam sayı dizisi) döndürür; risk skoruna katkısı sayı x ağırlıktır.
+    inputs sadece dedektörün bildirdiği istatistikleri içerir, böylece isteğe
+    bağlı istatistikler (OPTIONAL_STATS) yalnızca etkin dedektörler istediğinde
+    hesaplanır. outputs, dedektör çalıştığında sonuçlara bağlam olarak
+    eklenen istatistiklerdir. cost göreli hesap maliyetidir (1 ucuz - 3 pahalı).
+    default False ise dedektör sadece adıyla seçildiğinde çalışır.
+    describe(result, positions, values) tetiklenen sonuç satırları için
+    'Anomaliler' metinlerini üretir.
+    """
+    def __init__(self, name, label, kernel, describe, inputs, weight, cost=1, outputs=(), default=True):
+        self.name = name
+        self.label = label
+        self.kernel = kernel
+        self.describe = describe
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+        self.weight = weight
+        self.cost = cost
+        self.default = default
+        self.bit = None
+
+# Kayıtlı dedektörler (kayıt sırası 'Anomaliler' metnindeki sırayı belirler) ve bit maskeleri
+DETECTORS = {}
+DETECTOR_BITS = {}
+
+# Sonuçlardaki bit maskesinin tipi; en fazla 16 dedektör kaydedilebilir
+DETECTOR_MASK_DTYPE = np.uint16
+
+# Dedektörlerin isteyebileceği, sadece gerektiğinde hesaplanan istatistikler
+OPTIONAL_STATS = ('trend_slopes', 'seasonal_flags', 'winter_means', 'neighbor_avg', 'building_z', 'building_rank')
+
+def register_detector(detector):
+    """Dedektörü kayda ekle ve bir sonuç maskesi biti ata"""
+    if detector.name in DETECTORS:
+        raise ValueError(f"Dedektör zaten kayıtlı: {detector.name}")
+    if len(DETECTORS) >= np.iinfo(DETECTOR_MASK_DTYPE).bits:
+        raise ValueError("Dedektör maskesinde boş bit kalmadı")
+    detector.bit = 1 << len(DETECTORS)
+    DETECTORS[detector.name] = detector
+    DETECTOR_BITS[detector.name] = detector.bit
+    return detector
+
+def resolve_detectors(names=None, max_cost=None):
+    """Adları verilen (None ise varsayılan) dedektörler, kayıt sırasıyla; max_cost üstündekiler hariç"""
+    if names is None:
+        names = default_detectors()
+    unknown = [name for name in names if name not in DETECTORS]
+    if unknown:
+        raise ValueError(f"Bilinmeyen dedektör: {', '.join(unknown)}")
+    return [
+        detector for name, detector in DETECTORS.items()
+        if name in names and (max_cost is None or detector.cost <= max_cost)
+    ]
+
+def default_detectors():
+    """Ad verilmediğinde çalışan dedektörlerin adları, kayıt sırasıyla"""
+    return [name for name, detector in DETECTORS.items() if detector.default]
+
+def _describe_drops(result, positions, values):
+    return [f"Ani düşüş: {count} kez" for count in values.tolist()]
+
+def _describe_zeros(result, positions, values):
+    return [f"Sıfır tüketim: {count} ay" for count in values.tolist()]
+
+def _describe_low(result, positions, values):
+    return [f"Düşük tüketim: Ortalama {avg:.1f}" for avg in np.nan_to_num(result.non_zero_avg[positions]).tolist()]
+
+def _describe_trend(result, positions, values):
+    return ["Trend anomalisi: Sürekli azalan tüketim trendi"] * len(positions)
+
+def _describe_seasonal(result, positions, values):
+    return ["Mevsimsel anomali: Kış aylarında beklenenden düşük tüketim"] * len(positions)
+
+def _describe_neighbor(result, positions, values):
+    current_avg = result.non_zero_avg[positions]
+    neighbor_avg = result.neighbor_avg[positions]
+    neighbor_pct = (neighbor_avg - current_avg) / neighbor_avg * 100
+    return [f"Komşu anomalisi: Komşulardan {pct:.0f}% daha az tüketim" for pct in neighbor_pct.tolist()]
+
+def _describe_winter_drops(result, positions, values):
+    return [f"Kış düşüşü: {count} kış önceki kışa göre" for count in values.tolist()]
+
+def _describe_building_outlier(result, positions, values):
+    return ["Bina içi aykırı değer: Bina medyanının belirgin altında tüketim"] * len(positions)
+
+def _trend_kernel(inputs, thresholds):
+    with np.errstate(invalid='ignore'):
+        return inputs['trend_slopes'] < -5
+
+def _neighbor_kernel(inputs, thresholds):
+    with np.errstate(invalid='ignore'):
+        return inputs['non_zero_avg'] < inputs['neighbor_avg'] * (thresholds['neighbor_threshold'] / 100)
+
+def _building_outlier_kernel(inputs, thresholds):
+    with np.errstate(invalid='ignore'):
+        return inputs['building_z'] < BUILDING_OUTLIER_Z
+
+def _winter_drop_kernel(inputs, thresholds):
+    """Önceki kışı taban tüketimin üstünde olup bir sonraki kış eşikten fazla düşen kış sayısı"""
+    winter_means = inputs['winter_means']
+    previous, current = winter_means[:, :-1], winter_means[:, 1:]
+    drop_factor = (100 - thresholds['drop_threshold']) / 100
+    drops = (previous >= thresholds['min_previous_winter']) & (current < previous * drop_factor)
+    return drops.sum(axis=1)
+
+# 1. Ani düşüş: eşiğe göre tesisat başına düşüş sayısı (ay ay tarama)
+register_detector(Detector(
+    'sudden_drop', "Ani düşüş",
+    kernel=lambda inputs, thresholds: inputs['drop_counts'],
+    describe=_describe_drops, inputs=('drop_counts',), weight=20, cost=3,
+))
+# 2. Sıfır tüketim: sıfır tüketimli ay sayısı
+register_detector(Detector(
+    'zero_consumption', "Sıfır tüketim",
+    kernel=lambda inputs, thresholds: inputs['zero_counts'],
+    describe=_describe_zeros, inputs=('zero_counts',), weight=15, cost=1,
+))
+# 3. Düşük tüketim: sıfır olmayan ayların ortalaması eşiğin altında
+register_detector(Detector(
+    'low_consumption', "Düşük tüketim",
+    kernel=lambda inputs, thresholds: (
+        (inputs['non_zero_counts'] == 0) | (inputs['non_zero_avg'] < thresholds['low_threshold'])
+    ),
+    describe=_describe_low, inputs=('non_zero_counts', 'non_zero_avg'), weight=25, cost=1,
+))
+# 4. Trend: son 24 ayın eğimi
+register_detector(Detector(
+    'trend', "Azalan trend",
+    kernel=_trend_kernel, describe=_describe_trend, inputs=('trend_slopes',), weight=30, cost=2,
+))
+# 5. Mevsimsel: kış ortalaması yaz ortalamasının %80'inin altında
+register_detector(Detector(
+    'seasonal', "Mevsimsel anomali",
+    kernel=lambda inputs, thresholds: inputs['seasonal_flags'],
+    describe=_describe_seasonal, inputs=('seasonal_flags',), weight=20, cost=2,
+))
+# 6. Komşu: bina içi diğer tesisatların ortalamasına göre düşük tüketim; sonuçlara
+# tesisatın bina içi robust z-skoru ve yüzdelik sırası eklenir
+register_detector(Detector(
+    'neighbor', "Komşu karşılaştırması",
+    kernel=_neighbor_kernel, describe=_describe_neighbor, inputs=('non_zero_avg', 'neighbor_avg'), weight=35, cost=2,
+    outputs=('building_z', 'building_rank'),
+))
+# 7. Kış düşüşü: takvim kışlarının aylık ortalamaları bir önceki kışa göre
+register_detector(Detector(
+    'winter_drop', "Kış düşüşü (yıllık)",
+    kernel=_winter_drop_kernel, describe=_describe_winter_drops, inputs=('winter_means',), weight=25, cost=2,
+))
+# 8. Bina içi aykırı değer: bina medyanı ve MAD ile robust z-skoru. Tetiklendiği
+# tesisatların çoğu komşu dedektörünü de tetiklediğinden (aynı düşüklük iki kez
+# puanlanır) varsayılan olarak kapalıdır; adıyla seçilince çalışır
+register_detector(Detector(
+    'building_outlier', "Bina içi aykırı değer",
+    kernel=_building_outlier_kernel, describe=_describe_building_outlier, inputs=('building_z',), weight=30, cost=2,
+    outputs=('building_rank',), default=False,
+))
+
+# Risk seviyesi kodları (0-3) ve adları
+RISK_LEVELS = np.array(["Normal", "Düşük Risk", "Orta Risk", "Yüksek Risk"], dtype=object)
+
+class AnomalyResult:
+    """Şüpheli tesisatların sütunsal (kompakt) sonuçları
+    
+    Her tesisat için skor, seviye kodu ve tetiklenen dedektörlerin bit maskesi
+    dizilerde tutulur; 'Anomaliler' metni sadece gösterilen veya dışa aktarılan
+    satırlar için to_frame() çağrıldığında üretilir. details, çalıştırılan
+    her dedektörün (kayıt sırasıyla) sonuç satırlarındaki çekirdek çıktısıdır.
+    building_z ve building_rank (0-1) tesisatın bina içi konumudur; bunları
+    hesaplayan dedektörler çalışmadıysa NaN'dır.
+    """
+    def __init__(self, rows, tn, bn, risk_scores, level_codes, mask, drop_counts, zero_counts,
+                 non_zero_avg, neighbor_avg, mean, total, last_6_mean, first_6_mean, details=None,
+                 building_z=None, building_rank=None):
+        self.rows = rows
+        self.tn = tn
+        self.bn = bn
+        self.risk_scores = risk_scores
+        self.level_codes = level_codes
+        self.mask = mask
+        self.drop_counts = drop_counts
+        self.zero_counts = zero_counts
+        self.non_zero_avg = non_zero_avg
+        self.neighbor_avg = neighbor_avg
+        self.mean = mean
+        self.total = total
+        self.last_6_mean = last_6_mean
+        self.first_6_mean = first_6_mean
+        self.details = details if details is not None else {}
+        self.building_z = building_z if building_z is not None else np.full(len(rows), np.nan, dtype=np.float32)
+        self.building_rank = building_rank if building_rank is not None else np.full(len(rows), np.nan, dtype=np.float32)
+        # Sonucu üreten analizin aşama ölçümleri (PerformanceLog)
+        self.performance = None
+        self._ranking = None
+        self._level_rankings = {}
+        self._tn_text = None
+        self._tn_positions = None
+        self._last_search = None
+        self._building_summary = None
+    
+    def __len__(self):
+        return len(self.rows)
+    
+    @staticmethod
+    def _level_code(level):
+        """Risk seviyesi adını koduna çevir"""
+        return RISK_LEVELS.tolist().index(level)
+    
+    def ranking(self, level=None):
+        """Risk skoruna göre azalan sıralı sonuç satırları; eşit skorlar veri sırasını korur
+        
+        Seviye verilirse sadece o seviyenin sıralı satırları döner. Sıralamalar
+        bir kez hesaplanıp saklanır.
+        """
+        if self._ranking is None:
+            self._ranking = np.lexsort((self.rows, -self.risk_scores.astype(np.int64)))
+        if level is None:
+            return self._ranking
+        code = self._level_code(level)
+        if code not in self._level_rankings:
+            self._level_rankings[code] = self._ranking[self.level_codes[self._ranking] == code]
+        return self._level_rankings[code]
+    
+    def top_k(self, k, level=None):
+        """En yüksek riskli k satır; tam sıralama yapmadan seçilir"""
+        candidates = np.arange(len(self)) if level is None else np.flatnonzero(self.level_codes == self._level_code(level))
+        if k >= len(candidates):
+            return self.ranking(level)
+        if k <= 0:
+            return candidates[:0]
+        
+        # k. en büyük skordan büyükler ve eşitlerden veri sırasına göre ilk gelenler
+        scores = self.risk_scores[candidates]
+        kth = np.partition(scores, len(scores) - k)[len(scores) - k]
+        above = candidates[scores > kth]
+        ties = candidates[scores == kth][:k - len(above)]
+        selected = np.concatenate([above, ties])
+        return selected[np.lexsort((self.rows[selected], -self.risk_scores[selected].astype(np.int64)))]
+    
+    def search(self, query=None, level=None):
+        """TN içinde query geçen satırlar, risk sırasıyla"""
+        ranked = self.ranking(level)
+        if not query:
+            return ranked
+        if self._last_search is not None and self._last_search[0] == (query, level):
+            return self._last_search[1]
+        
+        if self._tn_text is None:
+            self._tn_text = pd.Series(self.tn).astype(str)
+        matches = self._tn_text.iloc[ranked].str.contains(query, regex=False).to_numpy()
+        self._last_search = ((query, level), ranked[matches])
+        return ranked[matches]
+    
+    def position(self, tn):
+        """TN'nin (metin veya değer) sonuçtaki satırı; şüpheli değilse None (O(1))"""
+        if self._tn_positions is None:
+            tn_text = pd.Series(self.tn).astype(str).tolist()
+            self._tn_positions = dict(zip(reversed(tn_text), range(len(tn_text) - 1, -1, -1)))
+        return self._tn_positions.get(str(tn))
+    
+    def page(self, offset, page_size, level=None, query=None):
+        """Sayfalı sonuç: (sayfadaki satırlar, toplam eşleşen satır sayısı)"""
+        positions = self.search(query, level)
+        return positions[offset:offset + page_size], len(positions)
+    
+    @property
+    def detectors(self):
+        """Bu sonucu üreten dedektörlerin adları"""
+        return tuple(self.details)
+    
+    @property
+    def levels(self):
+        """Risk seviyesi adları"""
+        return RISK_LEVELS[self.level_codes]
+    
+    def detector_counts(self):
+        """Her dedektörün kaç tesisatta tetiklendiği"""
+        return {name: int(np.count_nonzero(self.mask & DETECTOR_BITS[name])) for name in self.details}
+    
+    def level_counts(self):
+        """Risk seviyelerine göre tesisat sayıları (boş seviyeler hariç)"""
+        counts = pd.Series(np.bincount(self.level_codes, minlength=len(RISK_LEVELS)), index=RISK_LEVELS)
+        return counts[counts > 0]
+    
+    def score_histogram(self, bins=20):
+        """Risk skoru histogramı: sabit aralıklı kutuların sınırları ve tesisat sayıları"""
+        counts, edges = np.histogram(self.risk_scores, bins=bins)
+        return pd.DataFrame({
+            'Alt_Sınır': edges[:-1],
+            'Üst_Sınır': edges[1:],
+            'Tesisat_Sayısı': counts,
+        })
+    
+    def building_summary(self):
+        """Bina başına şüpheli tesisat sayısı ve ortalama risk skoru, skora göre azalan"""
+        if self._building_summary is None:
+            codes, buildings = pd.factorize(self.bn)
+            valid = codes >= 0
+            counts = np.bincount(codes[valid], minlength=len(buildings))
+            score_sums = np.bincount(codes[valid], weights=self.risk_scores[valid], minlength=len(buildings))
+            summary = pd.DataFrame({
+                'Şüpheli_Tesisat_Sayısı': counts,
+                'Ortalama_Risk_Skoru': score_sums / np.maximum(counts, 1),
+            }, index=pd.Index(buildings, name='BN'))
+            self._building_summary = summary.sort_values('Ortalama_Risk_Skoru', ascending=False, kind='stable')
+        return self._building_summary
+    
+    def top_buildings(self, top_n=30):
+        """En riskli top_n bina; kalanlar tek bir 'Diğer' satırında toplanır"""
+        summary = self.building_summary()
+        top = summary.head(top_n).reset_index()
+        top['BN'] = top['BN'].astype(str)
+        rest = summary.iloc[top_n:]
+        if len(rest):
+            rest_count = rest['Şüpheli_Tesisat_Sayısı'].sum()
+            rest_score = (rest['Şüpheli_Tesisat_Sayısı'] * rest['Ortalama_Risk_Skoru']).sum() / rest_count
+            top.loc[len(top)] = [f"Diğer ({len(rest)} bina)", rest_count, rest_score]
+        return top
+    
+    def anomaly_texts(self, positions):
+        """Verilen sonuç satırları için 'Anomaliler' metinleri"""
+        positions = np.asarray(positions, dtype=np.int64)
+        mask = self.mask[positions]
+        texts = [[] for _ in positions]
+        
+        for name, values in self.details.items():
+            rows = np.flatnonzero(mask & DETECTOR_BITS[name])
+            detector_texts = DETECTORS[name].describe(self, positions[rows], values[positions[rows]])
+            for k, text in zip(rows.tolist(), detector_texts):
+                texts[k].append(text)
+        
+        return ['; '.join(t) for t in texts]
+    
+    def to_frame(self, positions=None, with_text=True):
+        """Sonuçları (veya seçili satırları) DataFrame olarak döndür"""
+        if positions is None:
+            positions = np.arange(len(self))
+        positions = np.asarray(positions, dtype=np.int64)
+        
+        frame = pd.DataFrame({
+            'TN': self.tn[positions],
+            'BN': self.bn[positions],
+            'Risk_Skoru': self.risk_scores[positions],
+            'Risk_Seviyesi': RISK_LEVELS[self.level_codes[positions]],
+        })
+        if with_text:
+            frame['Anomaliler'] = self.anomaly_texts(positions)
+        frame['Ortalama_Tuketim'] = self.mean[positions]
+        frame['Toplam_Tuketim'] = self.total[positions]
+        frame['Son_6_Ay_Ortalama'] = self.last_6_mean[positions]
+        frame['İlk_6_Ay_Ortalama'] = self.first_6_mean[positions]
+        frame['Bina_Z_Skoru'] = self.building_z[positions]
+        frame['Bina_Yüzdelik_Sırası'] = self.building_rank[positions] * 100
+        return frame
+
+# Rapor formatları ve MIME tipleri
+REPORT_FORMATS = {
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+# Raporlar bu kadar satırlık parçalar halinde üretilip yazılır
+REPORT_CHUNK_ROWS = 10_000
+
+def _report_chunks(result, chunk_rows):
+    """Sonuç satırlarını 'Anomaliler' metni üretilmiş parçalar halinde döndür"""
+    if len(result) == 0:
+        yield result.to_frame()
+        return
+    for start in range(0, len(result), chunk_rows):
+        yield result.to_frame(np.arange(start, min(start + chunk_rows, len(result))))
+
+def _write_sheet(workbook, title, frames):
+    """DataFrame parçalarını write-only çalışma sayfasına satır satır ekle"""
+    sheet = workbook.create_sheet(title)
+    for i, frame in enumerate(frames):
+        if i == 0:
+            sheet.append([str(column) for column in frame.columns])
+        values = frame.astype(object).where(frame.notna(), None)
+        for row in values.itertuples(index=False, name=None):
+            sheet.append(row)
+
+def write_report(result, target, fmt='xlsx', summary=None, buildings=None, chunk_rows=REPORT_CHUNK_ROWS):
+    """Şüpheli tesisat raporunu yaz
+    
+    target bir dosya yolu veya ikili dosya nesnesi olabilir. Satırlar parça parça
+    üretilip yazılır; Excel için openpyxl'in write-only modu kullanıldığından
+    çalışma kitabının tamamı bellekte tutulmaz. summary ve buildings sadece
+    Excel raporuna ayrı sayfa olarak eklenir. Excel için openpyxl, Parquet için
+    pyarrow gerekir.
+    """
+    if fmt not in REPORT_FORMATS:
+        raise ValueError(f"Desteklenmeyen rapor formatı: {fmt}")
+    chunks = _report_chunks(result, chunk_rows)
+    
+    if fmt == 'csv':
+        with open(target, 'wb') if isinstance(target, (str, os.PathLike)) else nullcontext(target) as handle:
+            for i, chunk in enumerate(chunks):
+                chunk.to_csv(handle, header=(i == 0), index=False, mode='wb')
+    
+    elif fmt == 'parquet':
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        
+        writer = None
+        try:
+            for chunk in chunks:
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(target, table.schema)
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+    
+    else:
+        from openpyxl import Workbook
+        
+        workbook = Workbook(write_only=True)
+        if summary is not None:
+            _write_sheet(workbook, 'Özet', [summary])
+        _write_sheet(workbook, 'Şüpheli_Tesisatlar', chunks)
+        if buildings is not None:
+            _write_sheet(workbook, 'Bina_Analizi', [buildings.reset_index()])
+        workbook.save(target)
+
+def _compact_ids(values):
+    """TN/BN sütununu küçült: int32'ye sığan tam sayılar int32, metinler kategori olur"""
+    if pd.api.types.is_integer_dtype(values):
+        limits = np.iinfo(np.int32)
+        if len(values) == 0 or (values.min() >= limits.min and values.max() <= limits.max):
+            return values.astype(np.int32)
+        return values
+    if pd.api.types.is_object_dtype(values) or pd.api.types.is_string_dtype(values):
+        return values.astype('category')
+    return values
+
+@lru_cache(maxsize=None)
+def _trend_weights(n_months):
+    """En küçük kareler eğimi için ortak tasarım: (x - x̄) / Σ(x - x̄)²"""
+    x = np.arange(n_months, dtype=np.float64)
+    x -= x.mean()
+    weights = x / (x @ x)
+    weights.flags.writeable = False
+    return weights
+
+def trend_slopes(data, min_months=12):
+    """Tüm tesisatların doğrusal trend eğimleri (np.polyfit(x, y, 1)[0] ile aynı)
+    
+    Ay sayısı min_months'tan azsa eğim NaN olur.
+    """
+    if data.shape[1] < min_months:
+        return np.full(len(data), np.nan)
+    return data.astype(np.float64) @ _trend_weights(data.shape[1])
+
+def rolling_trend_slopes(data, window=24, block_rows=50_000):
+    """Tüm geçmiş boyunca kayan pencere eğimleri (tesisat x pencere)
+    
+    Pencere başına eğim kümülatif toplamlardan hesaplanır:
+    Σ(t - t̄)·y = Σ t·y - t̄·Σ y. Bellek için satırlar bloklar halinde işlenir.
+    """
+    n_rows, n_months = data.shape
+    n_windows = n_months - window + 1
+    if n_windows <= 0:
+        return np.empty((n_rows, 0))
+    
+    t = np.arange(n_months, dtype=np.float64)
+    t_mean = np.arange(n_windows) + (window - 1) / 2
+    sxx = window * (window ** 2 - 1) / 12
+    slopes = np.empty((n_rows, n_windows))
+    for start in range(0, n_rows, block_rows):
+        block = data[start:start + block_rows].astype(np.float64)
+        sum_y = np.zeros((len(block), n_months + 1))
+        sum_ty = np.zeros((len(block), n_months + 1))
+        np.cumsum(block, axis=1, out=sum_y[:, 1:])
+        np.cumsum(block * t, axis=1, out=sum_ty[:, 1:])
+        window_y = sum_y[:, window:] - sum_y[:, :n_windows]
+        window_ty = sum_ty[:, window:] - sum_ty[:, :n_windows]
+        slopes[start:start + block_rows] = (window_ty - t_mean * window_y) / sxx
+    return slopes
+
+def _group_totals(codes, values, valid):
+    """Grup kodlarına göre değer toplamı ve geçerli değer sayısı (kod -1 ise gruba dahil değil)"""
+    has_group = codes >= 0
+    n_groups = codes.max() + 1 if has_group.any() else 0
+    group_sum = np.bincount(codes[has_group], weights=values[has_group], minlength=n_groups)
+    group_count = np.bincount(codes[has_group], weights=valid[has_group], minlength=n_groups)
+    return group_sum, group_count
+
+def _neighbor_averages(facility_avg, building_codes, own_codes):
+    """Her tesisat için aynı binadaki diğer tesisatların ortalama tüketimi"""
+    valid = ~np.isnan(facility_avg)
+    values = np.where(valid, facility_avg, 0.0)
+    building_sum, building_count = _group_totals(building_codes, values, valid)
+    own_sum, own_count = _group_totals(own_codes, values, valid)
+    has_building = building_codes >= 0
+    has_own = own_codes >= 0
+    
+    # Bina toplamından tesisatın kendi (BN, TN) katkısı çıkarılır
+    neighbor_sum = np.zeros(len(values))
+    neighbor_count = np.zeros(len(values))
+    neighbor_sum[has_building] = building_sum[building_codes[has_building]]
+    neighbor_count[has_building] = building_count[building_codes[has_building]]
+    neighbor_sum[has_own] -= own_sum[own_codes[has_own]]
+    neighbor_count[has_own] -= own_count[own_codes[has_own]]
+    
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(neighbor_count > 0, neighbor_sum / neighbor_count, np.nan)
+
+# Bina içi robust istatistikler: MAD'yi normal dağılım standart sapmasına çeviren
+# katsayı, MAD sıfırsa kullanılan ortalama mutlak sapma katsayısı, z-skoru için
+# gereken en az tesisat sayısı ve aykırı değer eşiği
+MAD_SCALE = 1.4826
+MEAN_AD_SCALE = 1.253314
+BUILDING_MIN_FACILITIES = 5
+BUILDING_OUTLIER_Z = -3.5
+
+# Bina istatistiklerinde raporlanan yüzdelikler
+BUILDING_PERCENTILES = (10, 25, 75, 90)
+
+def _grouped_quantile(sorted_values, starts, counts, q):
+    """Grup içinde sıralı değerlerden her grubun q yüzdeliği (np.percentile 'linear' ile aynı)"""
+    result = np.full(len(counts), np.nan)
+    has_values = counts > 0
+    position = starts[has_values] + (counts[has_values] - 1) * q
+    lower = np.floor(position).astype(np.int64)
+    upper = np.ceil(position).astype(np.int64)
+    fraction = position - lower
+    result[has_values] = sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * fraction
+    return result
+
+def _building_robust_stats(values, building_codes):
+    """Bina başına medyan, MAD ve yüzdelikler; tesisat başına bina içi robust z-skoru ve yüzdelik sıra
+    
+    Tesisatlar (bina, değer) sırasına bir kez dizilir; tüm bina istatistikleri
+    bu sıralı dizideki grup sınırlarından okunur, maliyet n log n'dir. Değeri
+    olmayan (NaN) veya binası olmayan tesisatlar hesaba katılmaz. z-skoru
+    BUILDING_MIN_FACILITIES'ten az tesisatlı binalarda ve sapma sıfırsa NaN olur.
+    """
+    n_buildings = building_codes.max() + 1 if len(building_codes) and building_codes.max() >= 0 else 0
+    rows = np.flatnonzero((building_codes >= 0) & ~np.isnan(values))
+    order = rows[np.lexsort((values[rows], building_codes[rows]))]
+    sorted_codes = building_codes[order]
+    sorted_values = values[order].astype(np.float64)
+    
+    counts = np.bincount(sorted_codes, minlength=n_buildings)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]]).astype(np.int64)
+    stats = {'count': counts, 'median': _grouped_quantile(sorted_values, starts, counts, 0.5)}
+    for percentile in BUILDING_PERCENTILES:
+        stats[f'p{percentile}'] = _grouped_quantile(sorted_values, starts, counts, percentile / 100)
+    
+    # MAD: medyandan mutlak sapmaların grup içi medyanı
+    deviations = np.abs(sorted_values - stats['median'][sorted_codes])
+    deviation_order = np.lexsort((deviations, sorted_codes))
+    stats['mad'] = _grouped_quantile(deviations[deviation_order], starts, counts, 0.5)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_ad = np.bincount(sorted_codes, weights=deviations, minlength=n_buildings) / counts
+    scale = np.where(stats['mad'] > 0, MAD_SCALE * stats['mad'], MEAN_AD_SCALE * mean_ad)
+    scale[(counts < BUILDING_MIN_FACILITIES) | ~(scale > 0)] = np.nan
+    stats['scale'] = scale
+    
+    # Yüzdelik sıra: binadaki daha düşük değerler + eşit değerlerin yarısı
+    position = np.arange(len(order))
+    run_start = np.ones(len(order), dtype=bool)
+    run_start[1:] = (sorted_codes[1:] != sorted_codes[:-1]) | (sorted_values[1:] != sorted_values[:-1])
+    first = np.maximum.accumulate(np.where(run_start, position, 0))
+    run_end = np.ones(len(order), dtype=bool)
+    run_end[:-1] = run_start[1:]
+    last = np.minimum.accumulate(np.where(run_end, position, len(order))[::-1])[::-1]
+    group_start = starts[sorted_codes]
+    
+    stats['building_z'] = np.full(len(values), np.nan)
+    stats['building_rank'] = np.full(len(values), np.nan)
+    stats['building_z'][order] = (sorted_values - stats['median'][sorted_codes]) / scale[sorted_codes]
+    stats['building_rank'][order] = ((first - group_start) + (last - first + 1) / 2) / counts[sorted_codes]
+    return stats
+
+# Ani düşüş sayıları en fazla ay sayısı kadardır; tesisat başına 2 bayt yeter
+DROP_COUNT_DTYPE = np.int16
+
+def _count_drops(data, drop_threshold, report=None):
+    """Ardışık aylar arasındaki ani düşüş sayıları (sütun çiftleri üzerinde, float64 karşılaştırma)"""
+    drop_factor = (100 - drop_threshold) / 100
+    drop_counts = np.zeros(len(data), dtype=DROP_COUNT_DTYPE)
+    for i in range(1, data.shape[1]):
+        if report is not None:
+            report(i - 1, data.shape[1] - 1)
+        prev = data[:, i-1].astype(np.float64)
+        drop_counts += (prev > 0) & (data[:, i] < prev * drop_factor)
+    return drop_counts
+
+def _seasonal_flags(data, schema):
+    """Kış ortalaması yaz ortalamasının %80'inin altında kalan tesisatlar (en az 24 ay gerekir)"""
+    if data.shape[1] >= 24 and len(schema.winter_idx) > 0 and len(schema.summer_idx) > 0:
+        winter_avg = data[:, schema.winter_idx].mean(axis=1, dtype=np.float64)
+        summer_avg = data[:, schema.summer_idx].mean(axis=1, dtype=np.float64)
+        return winter_avg < summer_avg * 0.8
+    return np.zeros(len(data), dtype=bool)
+
+def _winter_means(data, schema):
+    """Her tam kışın aylık ortalaması (tesisat x kış), tüm kışlar tek toplu indekslemeyle"""
+    if len(schema.winter_seasons) == 0:
+        return np.zeros((len(data), 0), dtype=np.float64)
+    return data[:, schema.winter_seasons].mean(axis=2, dtype=np.float64)
+
+def _row_stats(data, schema, performance=None, keys=OPTIONAL_STATS):
+    """Tesisat başına, diğer satırlardan bağımsız istatistikler
+    
+    İsteğe bağlı istatistiklerden sadece keys içindekiler hesaplanır.
+    """
+    n_months = data.shape[1]
+    
+    # 2. Sıfır tüketim tespiti
+    with _stage(performance, 'zero_consumption', len(data)):
+        zero_counts = (data == 0).sum(axis=1)
+    
+    # Sıfır olmayan ayların ortalaması (düşük tüketim ve komşu karşılaştırması)
+    with _stage(performance, 'non_zero_mean', len(data)):
+        non_zero_counts = n_months - zero_counts
+        with np.errstate(invalid='ignore', divide='ignore'):
+            non_zero_avg = data.sum(axis=1, dtype=np.float64) / non_zero_counts
+    
+    stats = {}
+    
+    # 4. Trend analizi (son 24 ay, en küçük kareler eğimi)
+    if 'trend_slopes' in keys:
+        with _stage(performance, 'trend', len(data)):
+            stats['trend_slopes'] = trend_slopes(data[:, schema.last(24)])
+    
+    # 5. Mevsimsel anomali
+    if 'seasonal_flags' in keys:
+        with _stage(performance, 'seasonal', len(data)):
+            stats['seasonal_flags'] = _seasonal_flags(data, schema)
+    
+    # 7. Kış ortalamaları (yıllık kış düşüşü)
+    if 'winter_means' in keys:
+        with _stage(performance, 'winter_means', len(data)):
+            stats['winter_means'] = _winter_means(data, schema)
+    
+    with _stage(performance, 'summary', len(data)):
+        stats.update({
+            'zero_counts': zero_counts,
+            'non_zero_counts': non_zero_counts,
+            'non_zero_avg': non_zero_avg,
+            'mean': data.mean(axis=1, dtype=np.float64),
+            'total': data.sum(axis=1, dtype=np.float64),
+            'last_6_mean': data[:, schema.last(6)].mean(axis=1, dtype=np.float64),
+            'first_6_mean': data[:, schema.first(6)].mean(axis=1, dtype=np.float64),
+        })
+    return stats
+
+def _facility_stats(data, schema, building_codes, own_codes, performance=None, keys=OPTIONAL_STATS):
+    """Eşiklerden bağımsız istatistikler: sıfır sayıları, ortalamalar, trend, mevsim, komşu"""
+    stats = _row_stats(data, schema, performance, keys)
+    
+    # 6. Komşu ortalamaları
+    if 'neighbor_avg' in keys:
+        with _stage(performance, 'neighbor', len(data)):
+            stats['neighbor_avg'] = _neighbor_averages(stats['non_zero_avg'], building_codes, own_codes)
+    
+    # 8. Bina içi robust z-skoru ve yüzdelik sıra
+    if 'building_z' in keys or 'building_rank' in keys:
+        with _stage(performance, 'building_robust', len(data)):
+            robust = _building_robust_stats(stats['non_zero_avg'], building_codes)
+            stats['building_z'] = robust['building_z']
+            stats['building_rank'] = robust['building_rank']
+    return stats
+
+# Aynı TN birden fazla kaynakta geçtiğinde uygulanan çakışma kuralları
+TN_CONFLICT_RULES = ('last', 'first', 'max')
+
+def _source_name(source, sheet_name=None):
+    """Kayıtlar ve hata mesajları için kaynak adı"""
+    name = os.path.basename(str(getattr(source, 'name', source)))
+    return name if sheet_name is None else f"{name} [{sheet_name}]"
+
+def _parse_source(source, sheet_name=None):
+    """Tek bir dosyayı veya Excel sayfasını (TN, BN, YYYY/AA) tablosuna çevir
+    
+    Paralel okumada işçi süreçlerde çalışır. Tarih sütunları ortak şema için
+    YYYY/AA adlarına çevrilir. Okunamayan veya TN, BN ya da tarih sütunu
+    olmayan kaynaklar için (None, hata mesajı) döner.
+    """
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    part = GasLeakDetector(compact=False)
+    if not part.load_data(source, sheet_name=0 if sheet_name is None else sheet_name):
+        return None, part.load_error
+    missing = [column for column in ('TN', 'BN') if column not in part.df.columns]
+    if missing:
+        return None, f"{', '.join(missing)} sütunu yok"
+    if not part.preprocess_data(build_index=False) or len(part.schema) == 0:
+        return None, "Tarih sütunu yok"
+    
+    # Sütunlar yerinde yeniden adlandırılır; tüketim zaten float32 ise kopyalanmaz
+    labels = part.schema.labels()
+    frame = part.df
+    if list(frame.columns) != ['TN', 'BN'] + part.schema.columns:
+        frame = frame[['TN', 'BN'] + part.schema.columns]
+    frame.columns = ['TN', 'BN'] + labels
+    if (frame[labels].dtypes != np.float32).any():
+        frame[labels] = frame[labels].astype(np.float32)
+    return frame, None
+
+def _merge_conflicts(current, new, tn_conflict):
+    """Aynı TN'nin iki satırını tn_conflict kuralıyla birleştir; NaN (ay yok) değerler atlanır"""
+    if tn_conflict == 'max':
+        return np.fmax(current, new)
+    if tn_conflict == 'first':
+        return np.where(np.isnan(current), new, current)
+    return np.where(np.isnan(new), current, new)
+
+def _merge_by_tn(parts, tn_conflict='last'):
+    """Kaynak tablolarını ortak şemada birleştir, her TN'yi tek satıra indir
+    
+    Bir TN'nin her ayı için sadece o ay sütununu içeren kaynaklar dikkate alınır;
+    birden fazla kaynakta değer varsa tn_conflict kuralı uygulanır. TN'si boş
+    satırlar olduğu gibi korunur. Bellek için parts listesi birleştirilirken
+    boşaltılır.
+    """
+    labels = ColumnSchema(pd.Index([]).append([part.columns for part in parts]).unique()).columns
+    label_index = pd.Index(labels)
+    partial = any(len(part.columns) != len(labels) + 2 for part in parts)
+    tn = pd.concat([part['TN'] for part in parts], ignore_index=True)
+    bn = pd.concat([part['BN'] for part in parts], ignore_index=True)
+    
+    # Her satırın sonuçtaki konumu (TN'nin ilk geçtiği sıra; TN'siz satırlar sonda)
+    # ve aynı TN'nin kaçıncı satırı olduğu (kaynak sırasıyla)
+    codes, uniques = pd.factorize(tn)
+    has_tn = codes >= 0
+    target = codes.astype(np.int64)
+    target[~has_tn] = len(uniques) + np.arange((~has_tn).sum())
+    counts = np.bincount(target, minlength=len(uniques) + (~has_tn).sum())
+    order = np.argsort(target, kind='stable')
+    occurrence = np.empty(len(target), dtype=np.int64)
+    occurrence[order] = np.arange(len(order)) - np.repeat(np.cumsum(counts) - counts, counts)
+    
+    # Parçalar sütun sütun sonuç matrisine işlenir; matris sütun öncelikli tutulur
+    # (DataFrame bloğuyla aynı düzen). Yazılmayan aylar NaN kalır ve kuralda atlanır
+    merged = np.full((len(counts), len(labels)), np.nan, dtype=np.float32, order='F')
+    start = 0
+    while parts:
+        part = parts.pop(0)
+        part_target = target[start:start + len(part)]
+        part_occurrence = occurrence[start:start + len(part)]
+        layers = [np.flatnonzero(part_occurrence == layer) for layer in np.unique(part_occurrence)]
+        for column, position in zip(part.columns[2:], label_index.get_indexer(part.columns[2:])):
+            column_values = part[column].to_numpy()
+            for rows in layers:
+                rows_target = part_target[rows]
+                merged[rows_target, position] = _merge_conflicts(
+                    merged[rows_target, position], column_values[rows], tn_conflict
+                )
+        start += len(part)
+        del part
+    
+    # Sadece bazı parçalarda olan ayların boş hücreleri 0 yapılır
+    if partial:
+        for column in merged.T:
+            column[np.isnan(column)] = 0
+    
+    # BN aynı kuralla seçilir (boş BN'ler atlanır)
+    merged_bn = getattr(bn[has_tn].groupby(codes[has_tn]), tn_conflict)().reindex(range(len(uniques)))
+    frame = pd.DataFrame(merged, columns=labels, copy=False)
+    frame.insert(0, 'BN', np.concatenate([merged_bn.to_numpy(), bn[~has_tn].to_numpy()]))
+    frame.insert(0, 'TN', np.concatenate([uniques.to_numpy(), tn[~has_tn].to_numpy()]))
+    return frame
+
+# İşçi süreçler fork ile değil forkserver (Windows'ta spawn) ile başlatılır:
+# Streamlit sunucusu ve analiz iş parçacıkları çok iş parçacıklıdır, başka bir
+# iş parçacığının tuttuğu kilitle fork edilen süreç kilitlenebilir
+PROCESS_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+def _process_pool(max_workers):
+    """İşçi fonksiyonları modül düzeyinde olan, güvenli başlatma yöntemli süreç havuzu
+    
+    forkserver bu modülü (numpy ve pandas ile) bir kez yükler; işçiler hazır
+    sunucudan çatallandığından her havuzda kütüphaneler yeniden yüklenmez.
+    """
+    context = multiprocessing.get_context(PROCESS_START_METHOD)
+    if PROCESS_START_METHOD == 'forkserver':
+        context.set_forkserver_preload([__name__])
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=context)
+
+def _shard_facility_stats(shm_name, shape, dtype, schema, rows, building_codes, own_codes, keys=OPTIONAL_STATS):
+    """Paralel mod: paylaşılan bellekteki matrisin bir bina parçası için istatistikler"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        shared = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        data = shared[rows]
+        del shared
+        return _facility_stats(data, schema, building_codes, own_codes, keys=keys)
+    finally:
+        shm.close()
+
+class AnalysisCancelled(Exception):
+    """Analiz, cancel_event ile iptal edildi"""
+
+class GasLeakDetector:
+    # CSV dosyaları bu kadar satırlık parçalar halinde okunur
+    CSV_CHUNK_SIZE = 100_000
+    
+    # Ön işlenmiş matrislerin disk önbelleği
+    CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'dogalgaz_anomali')
+    
+    # Paralel mod bu satır sayısının altında devreye girmez
+    PARALLEL_MIN_ROWS = 50_000
+    
+    # İlerleme izlenirken istatistikler bu kadar satırlık bloklar halinde hesaplanır
+    PROGRESS_BLOCK_ROWS = 50_000
+    
+    # Ani düşüş sayıları en son kullanılan bu kadar eşik için bellekte tutulur
+    DROP_COUNT_CACHE_SIZE = 4
+    
+    # Artımlı güncelleme için diske yazılan istatistikler
+    STATS_FILE = 'stats.npz'
+    STATS_KEYS = (
+        'zero_counts', 'non_zero_counts', 'non_zero_avg', 'trend_slopes', 'seasonal_flags',
+        'neighbor_avg', 'mean', 'total', 'last_6_mean', 'first_6_mean',
+        'n_months', 'winter_sum', 'summer_sum', 'winter_months', 'summer_months', 'head', 'tail',
+    )
+    
+    def __init__(self, n_jobs=1, track_memory=False, profile_path=None, compact=True):
+        self.n_jobs = n_jobs
+        self.compact = compact
+        # Yükleme ve ön işleme ölçümleri; her analiz kendi kaydına ölçülür (AnomalyResult.performance)
+        self.load_performance = PerformanceLog(track_memory, profile_path)
+        # Süren analizin kaydı ve işçi sayısı; dedektörü paylaşan analizler birbirini etkilemez
+        self._analysis = threading.local()
+        self.df = None
+        self.load_error = None
+        self.is_clean = False
+        self.schema = None
+        self.suspicious_facilities = []
+        self.building_index = None
+        self.facility_index = None
+        self.facility_stats = None
+        
+        # Arka plan analizi: ilerleme bildirimi (aşama, tamamlanan, toplam) ve iptal
+        self.progress_callback = None
+        self.cancel_event = None
+        self.analysis_lock = threading.Lock()
+        
+    @property
+    def performance(self):
+        """Bu iş parçacığında süren analizin ölçüm kaydı; analiz dışında yükleme kaydı"""
+        return getattr(self._analysis, 'log', None) or self.load_performance
+    
+    @property
+    def analysis_jobs(self):
+        """Bu iş parçacığında süren analizin işçi süreç sayısı; analiz dışında n_jobs"""
+        return getattr(self._analysis, 'n_jobs', None) or self.n_jobs
+    
+    @_timed('load_data')
+    def load_data(self, uploaded_file, chunksize=CSV_CHUNK_SIZE, sheet_name=0):
+        """Excel dosyasını yükle ve temizle (dosya yolu veya name özellikli dosya nesnesi)"""
+        name = str(getattr(uploaded_file, 'name', uploaded_file))
+        try:
+            self.is_clean = False
+            self.load_error = None
+            
+            # Farklı dosya formatlarını destekle
+            if name.endswith('.xlsx'):
+                self.df = pd.read_excel(uploaded_file, sheet_name=sheet_name, engine='openpyxl')
+            elif name.endswith('.xls'):
+                self.df = pd.read_excel(uploaded_file, sheet_name=sheet_name, engine='xlrd')
+            elif chunksize:
+                # CSV: sadece TN, BN ve tarih sütunları parça parça okunur
+                self.df = self._read_csv_chunked(uploaded_file, chunksize)
+                self.is_clean = True
+            else:
+                # CSV olarak da deneyelim
+                self.df = pd.read_csv(uploaded_file)
+            
+            logger.info("Dosya yüklendi: %s (%d satır, %d sütun)", name, *self.df.shape)
+            return True
+        except Exception as e:
+            self.load_error = str(e)
+            logger.error("Dosya yüklenirken hata: %s: %s", name, e)
+            return False
+    
+    @_timed('load_files')
+    def load_files(self, sources, tn_conflict='last'):
+        """Birden çok dosyayı ve Excel sayfasını okuyup tek tabloda birleştir
+        
+        Her Excel sayfası ayrı bir kaynak olarak n_jobs işçi süreçte okunur ve
+        tarih sütunları (yıl, ay) üzerinden ortak şemaya hizalanır. Aynı TN
+        birden fazla satırda geçerse tek tesisata birleştirilir; aynı ay için
+        birden fazla değer varsa tn_conflict kuralı uygulanır ('last': sonraki
+        kaynak, 'first': ilk kaynak, 'max': en büyük değer), BN de aynı kuralla
+        seçilir. Kaynak sırası dosyaların verilen sırası ve dosya içindeki
+        sayfa sırasıdır. TN, BN veya tarih sütunu olmayan sayfalar atlanır.
+        Tek bir kaynak da aynı kurallarla birleştirilir (TN'leri tekilse birleştirme
+        atlanır); sonuç kaynak sayısına bağlı değildir.
+        """
+        if tn_conflict not in TN_CONFLICT_RULES:
+            raise ValueError(f"Geçersiz TN çakışma kuralı: {tn_conflict}")
+        self.is_clean = False
+        self.load_error = None
+        
+        try:
+            units = self._source_units(sources)
+        except Exception as e:
+            self.load_error = str(e)
+            logger.error("Dosyalar okunurken hata: %s", e)
+            return False
+        if self.n_jobs > 1 and len(units) > 1:
+            with _process_pool(min(self.n_jobs, len(units))) as pool:
+                parsed = list(pool.map(_parse_source, *zip(*units)))
+        else:
+            parsed = [_parse_source(source, sheet_name) for source, sheet_name in units]
+        
+        parts = []
+        for (source, sheet_name), (frame, error) in zip(units, parsed):
+            if frame is None:
+                logger.warning("Kaynak atlandı: %s: %s", _source_name(source, sheet_name), error)
+            else:
+                parts.append(frame)
+        if not parts:
+            # Tek kaynakta okuma hatası olduğu gibi bildirilir
+            self.load_error = parsed[0][1] if len(units) == 1 else "TN, BN ve tarih sütunları olan dosya veya sayfa bulunamadı"
+            return False
+        
+        rows = sum(len(frame) for frame in parts)
+        n_parts = len(parts)
+        del parsed
+        if len(parts) == 1 and parts[0]['TN'].notna().all() and parts[0]['TN'].is_unique:
+            # Tekrarlanan TN'si olmayan tek kaynakta birleştirilecek satır yoktur
+            self.df = parts[0]
+        else:
+            with self.performance.stage('merge_by_tn', rows):
+                self.df = _merge_by_tn(parts, tn_conflict)
+        del parts
+        self.schema = ColumnSchema(self.df.columns)
+        self.is_clean = True
+        self.building_index = None
+        self.facility_index = None
+        self.facility_stats = None
+        logger.info("%d kaynaktan %d satır birleştirildi: %d tesisat, %d ay",
+                    n_parts, rows, len(self.df), len(self.schema))
+        return True
+    
+    @staticmethod
+    def _source_units(sources):
+        """Dosyaları (kaynak, sayfa) birimlerine aç; Excel dosyalarının her sayfası ayrı birimdir"""
+        units = []
+        for source in sources:
+            name = str(getattr(source, 'name', source))
+            if name.endswith(('.xlsx', '.xls')):
+                if hasattr(source, 'seek'):
+                    source.seek(0)
+                engine = 'openpyxl' if name.endswith('.xlsx') else 'xlrd'
+                with pd.ExcelFile(source, engine=engine) as workbook:
+                    sheet_names = workbook.sheet_names
+                units.extend((source, sheet_name) for sheet_name in sheet_names)
+            else:
+                units.append((source, None))
+        return units
+    
+    def _read_csv_chunked(self, uploaded_file, chunksize):
+        """CSV dosyasını parçalar halinde oku; her parça okunurken temizlenir"""
+        header = pd.read_csv(uploaded_file, nrows=0).columns
+        if hasattr(uploaded_file, 'seek'):
+            uploaded_file.seek(0)
+        self.schema = ColumnSchema(header)
+        date_columns = self.schema.columns
+        
+        chunks = []
+        reader = pd.read_csv(
+            uploaded_file,
+            usecols=['TN', 'BN'] + date_columns,
+            dtype={col: np.float32 for col in date_columns},
+            chunksize=chunksize
+        )
+        for chunk in reader:
+            # Sütun sırası dosyadaki sıraya göre gelir, kronolojik sıraya getir
+            chunk = chunk[['TN', 'BN'] + date_columns]
+            chunk[date_columns] = chunk[date_columns].fillna(0).clip(lower=0)
+            chunks.append(chunk)
+        
+        if not chunks:
+            return pd.DataFrame(columns=['TN', 'BN'] + date_columns)
+        return pd.concat(chunks, ignore_index=True)
+    
+    def save_cache(self, file_hash, cache_dir=CACHE_DIR):
+        """Ön işlenmiş TN/BN/tüketim matrisini .npy olarak diske yaz"""
+        target = os.path.join(cache_dir, file_hash)
+        if self.df is None or not self.is_clean:
+            return False
+        if os.path.isdir(target):
+            return True
+        
+        date_columns = self._get_schema().columns
+        tmp_dir = None
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            # Yarım kalan yazımlar görünmesin diye önce geçici dizine yazılır
+            tmp_dir = tempfile.mkdtemp(dir=cache_dir)
+            np.save(os.path.join(tmp_dir, 'consumption.npy'), self._consumption_matrix())
+            np.save(os.path.join(tmp_dir, 'tn.npy'), self.df['TN'].to_numpy(), allow_pickle=True)
+            np.save(os.path.join(tmp_dir, 'bn.npy'), self.df['BN'].to_numpy(), allow_pickle=True)
+            np.save(os.path.join(tmp_dir, 'columns.npy'), np.array(date_columns, dtype=object), allow_pickle=True)
+            os.rename(tmp_dir, target)
+        except OSError:
+            if tmp_dir is not None:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+            return os.path.isdir(target)
+        return True
+    
+    @_timed('load_cache')
+    def load_cache(self, file_hash, cache_dir=CACHE_DIR):
+        """Disk önbelleğindeki matrisi bellek eşlemeli (kopyasız) olarak yükle"""
+        target = os.path.join(cache_dir, file_hash)
+        if not os.path.isdir(target):
+            return False
+        
+        try:
+            consumption = np.load(os.path.join(target, 'consumption.npy'), mmap_mode='r')
+            tn = np.load(os.path.join(target, 'tn.npy'), allow_pickle=True)
+            bn = np.load(os.path.join(target, 'bn.npy'), allow_pickle=True)
+            date_columns = np.load(os.path.join(target, 'columns.npy'), allow_pickle=True).tolist()
+        except (OSError, ValueError):
+            return False
+        
+        self.df = pd.DataFrame(consumption, columns=date_columns, copy=False)
+        self.df.insert(0, 'TN', tn)
+        self.df.insert(1, 'BN', bn)
+        self.is_clean = True
+        self.schema = ColumnSchema(date_columns)
+        self.building_index = None
+        self.facility_index = None
+        self.facility_stats = None
+        return True
+    
+    def save_stats(self, file_hash, cache_dir=CACHE_DIR):
+        """Eşikten bağımsız istatistikleri ve birikimli değerleri önbellek dizinine yaz
+        
+        Dosyanın matrisi save_cache ile önceden yazılmış olmalıdır. İsteğe bağlı
+        istatistiklerden sadece hesaplanmış olanlar yazılır; eksikler yüklendikten
+        sonra ilk ihtiyaçta hesaplanır. Eşiğe bağlı ani düşüş sayıları yazılmaz.
+        """
+        target = os.path.join(cache_dir, file_hash)
+        if self.df is None or not os.path.isdir(target):
+            return False
+        
+        stats = self._running_stats()
+        arrays = {key: np.asarray(stats[key]) for key in self.STATS_KEYS if key in stats}
+        arrays['periods'] = np.array(self._get_schema().periods, dtype=np.int32).reshape(-1, 2)
+        
+        tmp_path = None
+        try:
+            with tempfile.NamedTemporaryFile(dir=target, suffix='.npz', delete=False) as f:
+                tmp_path = f.name
+                np.savez(f, **arrays)
+            os.replace(tmp_path, os.path.join(target, self.STATS_FILE))
+        except OSError:
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
+        return True
+    
+    def load_stats(self, file_hash, cache_dir=CACHE_DIR):
+        """save_stats ile yazılmış istatistikleri yükle; veriyle uyuşmazsa False"""
+        path = os.path.join(cache_dir, file_hash, self.STATS_FILE)
+        if self.df is None or not os.path.exists(path):
+            return False
+        
+        try:
+            with np.load(path) as f:
+                arrays = {key: f[key] for key in f.files}
+        except (OSError, ValueError):
+            return False
+        periods = [tuple(period) for period in arrays['periods'].tolist()]
+        if len(arrays['zero_counts']) != len(self.df) or periods != self._get_schema().periods:
+            return False
+        
+        if any(key not in arrays for key in self.STATS_KEYS if key not in OPTIONAL_STATS):
+            return False
+        stats = {key: arrays[key] for key in self.STATS_KEYS if key in arrays}
+        for key in ('n_months', 'winter_months', 'summer_months'):
+            stats[key] = int(stats[key])
+        stats['drop_counts'] = OrderedDict()
+        stats['data'] = None
+        self.facility_stats = stats
+        return True
+    
+    @_timed('apply_delta')
+    def apply_delta(self, delta_file):
+        """Sadece yeni ay(lar)ı içeren dosyayı mevcut veriye ekle
+        
+        Eşikten bağımsız istatistikler geçmiş yeniden taranmadan birikimli
+        değerler (toplamlar, sıfır sayıları, mevsim toplamları, ilk 6 ve son 24
+        ay, hesaplanmış eşikler için ani düşüş sayıları) üzerinden güncellenir;
+        maliyet yeni ay sayısıyla orantılıdır. Geçmişte olmayan tesisatlar
+        atlanır, dosyada olmayan tesisatların yeni ayları 0 kabul edilir; aynı
+        TN'ye sahip satırlara dosyadaki ilk satır uygulanır. Mevcut dizi ve sözlükler değiştirilmez, yenileri oluşturulur.
+        """
+        if self.df is None:
+            self.load_error = "Önce geçmiş veri yüklenmeli"
+            return False
+        
+        delta = GasLeakDetector(compact=self.compact)
+        if not (delta.load_data(delta_file) and delta.preprocess_data(build_index=False)):
+            self.load_error = delta.load_error or "Yeni ay verisi okunamadı"
+            return False
+        
+        schema = self._get_schema()
+        if len(delta.schema) == 0:
+            self.load_error = "Yeni ay verisinde tarih sütunu bulunamadı"
+            return False
+        if len(schema) and delta.schema.periods[0] <= schema.periods[-1]:
+            self.load_error = f"Yeni ay verisi mevcut son aydan ({schema.labels()[-1]}) sonra başlamalı"
+            return False
+        
+        # Yeni aylar geçmişteki satır sırasına hizalanır
+        delta_values = pd.DataFrame(
+            delta._consumption_matrix(), index=pd.Index(delta.df['TN'].to_numpy()), columns=delta.schema.columns
+        )
+        delta_values = delta_values[~delta_values.index.duplicated()]
+        history_tn = self.df['TN'].to_numpy()
+        unknown = ~delta_values.index.isin(history_tn)
+        if unknown.any():
+            logger.warning("Yeni ay verisinde geçmişte olmayan %d tesisat atlandı", int(unknown.sum()))
+        block = delta_values.reindex(history_tn).fillna(0).to_numpy(dtype=np.float32)
+        
+        stats = self._running_stats()
+        with self.performance.stage('delta_stats', len(block)):
+            self.facility_stats = self._updated_stats(stats, block, delta.schema)
+        
+        new_columns = pd.DataFrame(block, columns=delta.schema.columns, index=self.df.index)
+        self.df = pd.concat([self.df, new_columns], axis=1)
+        self.schema = ColumnSchema(self.df.columns)
+        self.facility_index = None
+        self._set_building_totals(self.facility_stats['non_zero_avg'])
+        logger.info("%d yeni ay eklendi: %s", len(delta.schema), ', '.join(delta.schema.labels()))
+        return True
+    
+    def with_delta(self, delta_file):
+        """apply_delta uygulanmış yeni bir dedektör döndür; bu dedektör değişmez
+        
+        Hata durumunda None döner ve hata mesajı load_error'a yazılır.
+        """
+        updated = copy.copy(self)
+        updated.load_performance = PerformanceLog(self.load_performance.track_memory, self.load_performance.profile_path)
+        updated._analysis = threading.local()
+        updated.analysis_lock = threading.Lock()
+        if not updated.apply_delta(delta_file):
+            self.load_error = updated.load_error
+            return None
+        return updated
+    
+    @_timed('preprocess_data')
+    def preprocess_data(self, build_index=True):
+        """Veriyi ön işleme (build_index=False ise bina indeksi ilk ihtiyaçta kurulur)"""
+        if self.df is None:
+            return False
+            
+        # Tüketim sütunlarını (yıl, ay) olarak çözümle ve kronolojik sırala
+        self.schema = ColumnSchema(self.df.columns)
+        date_columns = self.schema.columns
+        
+        # Parça parça okunan veri zaten seçilmiş ve temizlenmiş durumda
+        if not self.is_clean:
+            # Sadece sayısal verileri al
+            numeric_columns = ['TN', 'BN'] + date_columns
+            self.df = self.df[numeric_columns]
+            
+            # Eksik verileri 0 ile doldur
+            self.df[date_columns] = self.df[date_columns].fillna(0)
+            
+            # Negatif değerleri 0 yap
+            self.df[date_columns] = self.df[date_columns].clip(lower=0)
+            
+            # Kompakt modda tüketim float32 olarak tutulur
+            if self.compact:
+                self.df[date_columns] = self.df[date_columns].astype(np.float32)
+            self.is_clean = True
+        
+        # Kompakt modda TN/BN int32 veya kategori olarak tutulur
+        if self.compact:
+            self.df['TN'] = _compact_ids(self.df['TN'])
+            self.df['BN'] = _compact_ids(self.df['BN'])
+        
+        # Komşu karşılaştırması için bina indeksini bir kez oluştur
+        self.building_index = None
+        if build_index:
+            self._build_building_index()
+        self.facility_index = None
+        self.facility_stats = None
+        
+        return True
+    
+    @_timed('building_index')
+    def _build_building_index(self):
+        """Bina indeksi: her binadaki tesisat ortalamalarının toplamı ve sayısı"""
+        data = self._consumption_matrix()
+        non_zero_counts = (data > 0).sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            facility_avg = data.sum(axis=1, dtype=np.float64) / non_zero_counts
+        
+        # Bina (BN) ve bina içi tesisat (BN, TN) kodları; eksik değerler -1
+        building_codes, buildings = pd.factorize(self.df['BN'])
+        own_codes, owners = pd.factorize(pd.Series(list(zip(self.df['BN'], self.df['TN'])), dtype=object))
+        own_codes[self.df['BN'].isna().to_numpy() | self.df['TN'].isna().to_numpy()] = -1
+        
+        self.building_index = {
+            'building_codes': building_codes,
+            'own_codes': own_codes,
+            'building_lookup': {bn: code for code, bn in enumerate(buildings)},
+            'own_lookup': {key: code for code, key in enumerate(owners)},
+        }
+        self._set_building_totals(facility_avg)
+    
+    def _set_building_totals(self, facility_avg):
+        """Bina indeksindeki toplamları verilen tesisat ortalamalarıyla yeniden kur (yeni sözlük)"""
+        index = dict(self.building_index)
+        index['facility_avg'] = facility_avg
+        # Robust istatistikler ve aylık profiller eski ortalamalara aittir
+        index.pop('robust', None)
+        index.pop('profiles', None)
+        valid = ~np.isnan(facility_avg)
+        values = np.where(valid, facility_avg, 0.0)
+        index['building_sum'], index['building_count'] = _group_totals(index['building_codes'], values, valid)
+        index['own_sum'], index['own_count'] = _group_totals(index['own_codes'], values, valid)
+        self.building_index = index
+    
+    def detect_anomalies(self, low_threshold=30, neighbor_threshold=60, drop_threshold=70,
+                         min_previous_winter=100, detectors=None, track_memory=False, n_jobs=None):
+        """Anomali tespiti algoritmaları (tüm tesisatlar tek matris üzerinde)"""
+        result = self.detect_anomalies_frame(low_threshold, neighbor_threshold, drop_threshold,
+                                             min_previous_winter, detectors, track_memory, n_jobs)
+        return result.to_dict('records')
+    
+    def detect_anomalies_frame(self, low_threshold=30, neighbor_threshold=60, drop_threshold=70,
+                               min_previous_winter=100, detectors=None, track_memory=False, n_jobs=None):
+        """Anomali tespiti; sonuçları 'Anomaliler' metniyle birlikte DataFrame olarak döndür"""
+        result = self.detect_anomalies_result(low_threshold, neighbor_threshold, drop_threshold,
+                                              min_previous_winter, detectors, track_memory, n_jobs)
+        with result.performance.stage('anomaly_texts', len(result)):
+            return result.to_frame()
+    
+    def detect_anomalies_result(self, low_threshold=30, neighbor_threshold=60, drop_threshold=70,
+                                min_previous_winter=100, detectors=None, track_memory=False, n_jobs=None):
+        """Anomali tespiti; sonuçları sütunsal AnomalyResult olarak döndür
+        
+        min_previous_winter kış düşüşü için önceki kışın en az aylık ortalama
+        tüketimidir (m³). detectors çalıştırılacak dedektör adlarıdır (None ise
+        default_detectors(), yani varsayılan olarak kapalı building_outlier hariç
+        kayıtlı tümü); sadece bu dedektörlerin istediği istatistikler hesaplanır. Eşiklerden
+        bağımsız istatistikler bir kez hesaplanır, eşik değiştiğinde sadece
+        eşiğe bağlı bayraklar ve risk skorları yeniden üretilir.
+        
+        Her çalıştırmanın aşamaları yeni bir PerformanceLog'a ölçülür ve
+        sonucun performance özelliğinde döner; track_memory açıksa tepe
+        bellek de ölçülür. n_jobs bu çalıştırmanın işçi süreç sayısıdır (None ise
+        dedektörün n_jobs değeri). Dedektörü paylaşan diğer analizlerin kayıtları
+        ve ayarları karışmaz.
+        """
+        performance = PerformanceLog(track_memory, self.load_performance.profile_path)
+        previous = getattr(self._analysis, 'log', None), getattr(self._analysis, 'n_jobs', None)
+        self._analysis.log, self._analysis.n_jobs = performance, n_jobs
+        try:
+            result = self._detect_anomalies_result(low_threshold, neighbor_threshold, drop_threshold,
+                                                   min_previous_winter, detectors)
+        finally:
+            self._analysis.log, self._analysis.n_jobs = previous
+        result.performance = performance
+        return result
+    
+    @_timed('detect_anomalies')
+    def _detect_anomalies_result(self, low_threshold, neighbor_threshold, drop_threshold,
+                                 min_previous_winter, detectors):
+        """detect_anomalies_result'ın gövdesi; aşamalar self.performance (analizin kaydı) ile ölçülür"""
+        if self.df is None:
+            return self._empty_result()
+        
+        selected = resolve_detectors(detectors)
+        needed = {key for detector in selected for key in detector.inputs}
+        outputs = {key for detector in selected for key in detector.outputs}
+        stats = self._get_facility_stats([key for key in OPTIONAL_STATS if key in needed | outputs])
+        self._report_progress('detect_anomalies', 0, len(self.df))
+        
+        inputs = {key: stats[key] for key in needed if key != 'drop_counts'}
+        if 'drop_counts' in needed:
+            inputs['drop_counts'] = self._drop_counts(drop_threshold)
+        thresholds = {
+            'low_threshold': low_threshold,
+            'neighbor_threshold': neighbor_threshold,
+            'drop_threshold': drop_threshold,
+            'min_previous_winter': min_previous_winter,
+        }
+        
+        # Dedektör çekirdekleri; tetiklenenlerin bit maskesi ve ağırlıklı risk skoru
+        mask = np.zeros(len(self.df), dtype=DETECTOR_MASK_DTYPE)
+        risk_scores = np.zeros(len(self.df), dtype=np.int64)
+        values = {}
+        for detector in selected:
+            with self.performance.stage(detector.name, len(self.df)):
+                counts = np.asarray(detector.kernel(inputs, thresholds))
+                mask |= (counts > 0) * DETECTOR_MASK_DTYPE(detector.bit)
+                risk_scores += counts.astype(np.int64) * detector.weight
+                values[detector.name] = counts
+        
+        level_codes = np.select(
+            [risk_scores >= 70, risk_scores >= 40, risk_scores >= 20],
+            [3, 2, 1],
+            default=0
+        ).astype(np.int8)
+        
+        rows = np.flatnonzero(mask)
+        drop_counts = values.get('sudden_drop', np.zeros(len(self.df), dtype=np.int32))
+        neighbor_avg = stats.get('neighbor_avg', np.full(len(self.df), np.nan))
+        building = {
+            key: stats[key][rows].astype(np.float32)
+            for key in ('building_z', 'building_rank') if key in needed | outputs
+        }
+        return AnomalyResult(
+            rows=rows,
+            tn=self.df['TN'].to_numpy()[rows],
+            bn=self.df['BN'].to_numpy()[rows],
+            risk_scores=risk_scores[rows].astype(np.int32),
+            level_codes=level_codes[rows],
+            mask=mask[rows],
+            drop_counts=drop_counts[rows].astype(np.int32),
+            zero_counts=stats['zero_counts'][rows].astype(np.int32),
+            non_zero_avg=stats['non_zero_avg'][rows],
+            neighbor_avg=neighbor_avg[rows],
+            mean=stats['mean'][rows].astype(np.float32),
+            total=stats['total'][rows].astype(np.float32),
+            last_6_mean=stats['last_6_mean'][rows].astype(np.float32),
+            first_6_mean=stats['first_6_mean'][rows].astype(np.float32),
+            details={name: counts[rows] for name, counts in values.items()},
+            building_z=building.get('building_z'),
+            building_rank=building.get('building_rank'),
+        )
+    
+    def _empty_result(self):
+        """Boş sonuç"""
+        empty_int = np.empty(0, dtype=np.int32)
+        empty_float = np.empty(0, dtype=np.float32)
+        return AnomalyResult(
+            rows=np.empty(0, dtype=np.int64), tn=np.empty(0), bn=np.empty(0),
+            risk_scores=empty_int, level_codes=np.empty(0, dtype=np.int8), mask=np.empty(0, dtype=DETECTOR_MASK_DTYPE),
+            drop_counts=empty_int, zero_counts=empty_int, non_zero_avg=empty_float, neighbor_avg=empty_float,
+            mean=empty_float, total=empty_float, last_6_mean=empty_float, first_6_mean=empty_float,
+        )
+    
+    def _get_facility_stats(self, keys=OPTIONAL_STATS):
+        """Eşiklerden bağımsız tesisat istatistiklerini döndür, yoksa hesapla
+        
+        keys içindeki isteğe bağlı istatistiklerden eksik olanlar eklenir.
+        """
+        if self.facility_stats is None:
+            self._compute_facility_stats(keys)
+        else:
+            missing = [key for key in keys if key not in self.facility_stats]
+            if missing:
+                self._complete_facility_stats(missing)
+        return self.facility_stats
+    
+    @_timed('facility_stats')
+    def _compute_facility_stats(self, keys=OPTIONAL_STATS):
+        """Eşiklerden bağımsız istatistikleri hesapla (analizin n_jobs'ı > 1 ise binalara göre paralel)"""
+        schema = self._get_schema()
+        data = self._consumption_matrix()
+        index = self._get_building_index()
+        
+        if self.analysis_jobs > 1 and len(data) >= self.PARALLEL_MIN_ROWS:
+            stats = self._compute_facility_stats_parallel(data, schema, index['building_codes'], index['own_codes'], keys)
+        elif self.progress_callback is None and self.cancel_event is None:
+            stats = _facility_stats(data, schema, index['building_codes'], index['own_codes'], self.performance, keys)
+        else:
+            stats = self._compute_facility_stats_blocks(data, schema, index['building_codes'], index['own_codes'], keys)
+        
+        stats['data'] = data
+        stats['drop_counts'] = OrderedDict()
+        self.facility_stats = stats
+    
+    @_timed('facility_stats')
+    def _complete_facility_stats(self, keys):
+        """Daha önce hesaplanmamış isteğe bağlı istatistikleri mevcut istatistiklere ekle"""
+        stats = self.facility_stats
+        if stats['data'] is None:
+            stats['data'] = self._consumption_matrix()
+        data = stats['data']
+        schema = self._get_schema()
+        
+        if 'trend_slopes' in keys:
+            with self.performance.stage('trend', len(data)):
+                stats['trend_slopes'] = trend_slopes(data[:, schema.last(24)])
+        if 'seasonal_flags' in keys:
+            with self.performance.stage('seasonal', len(data)):
+                stats['seasonal_flags'] = _seasonal_flags(data, schema)
+        if 'winter_means' in keys:
+            with self.performance.stage('winter_means', len(data)):
+                stats['winter_means'] = _winter_means(data, schema)
+        if 'neighbor_avg' in keys:
+            index = self._get_building_index()
+            with self.performance.stage('neighbor', len(data)):
+                stats['neighbor_avg'] = _neighbor_averages(stats['non_zero_avg'], index['building_codes'], index['own_codes'])
+        if 'building_z' in keys or 'building_rank' in keys:
+            robust = self._get_building_robust_stats()
+            stats['building_z'] = robust['building_z']
+            stats['building_rank'] = robust['building_rank']
+    
+    def _compute_facility_stats_blocks(self, data, schema, building_codes, own_codes, keys=OPTIONAL_STATS):
+        """Seri hesap, satır blokları halinde; her bloktan sonra ilerleme bildirilir
+        
+        Aşama süreleri bloklar üzerinden toplanıp analizin kaydına eklenir.
+        """
+        parts = []
+        block_performance = PerformanceLog()
+        for start in range(0, max(len(data), 1), self.PROGRESS_BLOCK_ROWS):
+            self._report_progress('facility_stats', start, len(data))
+            parts.append(_row_stats(data[start:start + self.PROGRESS_BLOCK_ROWS], schema, block_performance, keys))
+        self._report_progress('facility_stats', len(data), len(data))
+        self.performance.add_totals(block_performance)
+        
+        stats = {key: np.concatenate([part[key] for part in parts]) for key in parts[0]}
+        if 'neighbor_avg' in keys:
+            with self.performance.stage('neighbor', len(data)):
+                stats['neighbor_avg'] = _neighbor_averages(stats['non_zero_avg'], building_codes, own_codes)
+        if 'building_z' in keys or 'building_rank' in keys:
+            with self.performance.stage('building_robust', len(data)):
+                robust = _building_robust_stats(stats['non_zero_avg'], building_codes)
+                stats['building_z'] = robust['building_z']
+                stats['building_rank'] = robust['building_rank']
+        return stats
+    
+    def _compute_facility_stats_parallel(self, data, schema, building_codes, own_codes, keys=OPTIONAL_STATS):
+        """Matrisi paylaşılan belleğe koy, bina numarasına göre parçalayıp işçi süreçlerde hesapla"""
+        # Bir binanın tüm tesisatları aynı parçaya düşer; BN'si olmayanlar ilk parçaya
+        n_jobs = self.analysis_jobs
+        shard_of_row = np.where(building_codes >= 0, building_codes % n_jobs, 0)
+        shards = [np.flatnonzero(shard_of_row == k) for k in range(n_jobs)]
+        shards = [rows for rows in shards if len(rows) > 0]
+        
+        shm = shared_memory.SharedMemory(create=True, size=max(data.nbytes, 1))
+        try:
+            shared = np.ndarray(data.shape, dtype=data.dtype, buffer=shm.buf)
+            shared[:] = data
+            del shared
+            
+            with _process_pool(n_jobs) as pool:
+                futures = {
+                    pool.submit(_shard_facility_stats, shm.name, data.shape, data.dtype.str,
+                                schema, rows, building_codes[rows], own_codes[rows], tuple(keys)): k
+                    for k, rows in enumerate(shards)
+                }
+                results = [None] * len(shards)
+                done_rows = 0
+                try:
+                    self._report_progress('facility_stats', 0, len(data))
+                    for future in as_completed(futures):
+                        k = futures[future]
+                        results[k] = future.result()
+                        done_rows += len(shards[k])
+                        self._report_progress('facility_stats', done_rows, len(data))
+                except AnalysisCancelled:
+                    # Başlamamış parçalar iptal edilir; çalışan işçilerin bitmesi beklenir
+                    pool.shutdown(cancel_futures=True)
+                    raise
+        finally:
+            shm.close()
+            shm.unlink()
+        
+        # Parça sonuçları satır sırasına göre birleştirilir (seri çalışmayla aynı sıra)
+        stats = {}
+        for key, values in results[0].items():
+            stats[key] = np.empty((len(data),) + values.shape[1:], dtype=values.dtype)
+        for rows, shard_stats in zip(shards, results):
+            for key, values in shard_stats.items():
+                stats[key][rows] = values
+        return stats
+    
+    def _drop_counts(self, drop_threshold):
+        """Ani düşüş sayıları; son kullanılan DROP_COUNT_CACHE_SIZE eşik için önbellekte tutulur"""
+        stats = self._get_facility_stats(())
+        cache = stats['drop_counts']
+        if drop_threshold in cache:
+            cache.move_to_end(drop_threshold)
+        else:
+            # Diskten yüklenen veya artımlı güncellenen istatistiklerde matris ilk ihtiyaçta alınır
+            if stats['data'] is None:
+                stats['data'] = self._consumption_matrix()
+            data = stats['data']
+            with self.performance.stage('drop_counts', len(data)):
+                drop_counts = _count_drops(
+                    data, drop_threshold, lambda done, total: self._report_progress('drop_counts', done, total)
+                )
+            cache[drop_threshold] = drop_counts
+            while len(cache) > self.DROP_COUNT_CACHE_SIZE:
+                cache.popitem(last=False)
+        return cache[drop_threshold]
+    
+    def _running_stats(self):
+        """Tesisat istatistiklerine artımlı güncelleme için gereken birikimli değerleri ekle
+        
+        Mevsim toplamları ile ilk 6 ve son 24 ay (trend penceresi) bir kez
+        matristen alınır; sonraki güncellemeler sadece yeni aylarla yapılır.
+        """
+        stats = self._get_facility_stats(())
+        if 'tail' not in stats:
+            if stats['data'] is None:
+                stats['data'] = self._consumption_matrix()
+            data = stats['data']
+            schema = self._get_schema()
+            stats['n_months'] = data.shape[1]
+            stats['winter_sum'] = data[:, schema.winter_idx].sum(axis=1, dtype=np.float64)
+            stats['summer_sum'] = data[:, schema.summer_idx].sum(axis=1, dtype=np.float64)
+            stats['winter_months'] = len(schema.winter_idx)
+            stats['summer_months'] = len(schema.summer_idx)
+            stats['head'] = np.ascontiguousarray(data[:, schema.first(6)])
+            stats['tail'] = np.ascontiguousarray(data[:, schema.last(24)])
+        return stats
+    
+    def _updated_stats(self, stats, block, delta_schema):
+        """Birikimli istatistikleri yeni ay sütunlarıyla (tesisat x yeni ay) güncelle"""
+        n_months = stats['n_months'] + block.shape[1]
+        updated = dict(stats)
+        updated['n_months'] = n_months
+        updated['data'] = None
+        # Kış ortalamaları ve bina içi robust istatistikler gerektiğinde yeniden hesaplanır
+        for key in ('winter_means', 'building_z', 'building_rank'):
+            updated.pop(key, None)
+        
+        updated['zero_counts'] = stats['zero_counts'] + (block == 0).sum(axis=1)
+        updated['non_zero_counts'] = n_months - updated['zero_counts']
+        updated['total'] = stats['total'] + block.sum(axis=1, dtype=np.float64)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            updated['non_zero_avg'] = updated['total'] / updated['non_zero_counts']
+        updated['mean'] = updated['total'] / n_months
+        
+        # Mevsim toplamları
+        winter = np.isin(delta_schema.months, WINTER_MONTHS)
+        summer = np.isin(delta_schema.months, SUMMER_MONTHS)
+        updated['winter_sum'] = stats['winter_sum'] + block[:, winter].sum(axis=1, dtype=np.float64)
+        updated['summer_sum'] = stats['summer_sum'] + block[:, summer].sum(axis=1, dtype=np.float64)
+        updated['winter_months'] = stats['winter_months'] + int(winter.sum())
+        updated['summer_months'] = stats['summer_months'] + int(summer.sum())
+        # İsteğe bağlı istatistikler sadece daha önce hesaplanmışlarsa güncellenir
+        if 'seasonal_flags' in stats:
+            if n_months >= 24 and updated['winter_months'] > 0 and updated['summer_months'] > 0:
+                winter_avg = updated['winter_sum'] / updated['winter_months']
+                summer_avg = updated['summer_sum'] / updated['summer_months']
+                updated['seasonal_flags'] = winter_avg < summer_avg * 0.8
+            else:
+                updated['seasonal_flags'] = np.zeros(len(block), dtype=bool)
+        
+        # İlk 6 ay, son 24 ay penceresi ve trend
+        updated['head'] = np.hstack([stats['head'], block])[:, :6]
+        updated['tail'] = np.ascontiguousarray(np.hstack([stats['tail'], block])[:, -24:])
+        if 'trend_slopes' in stats:
+            updated['trend_slopes'] = trend_slopes(updated['tail'])
+        updated['last_6_mean'] = updated['tail'][:, -6:].mean(axis=1, dtype=np.float64)
+        updated['first_6_mean'] = updated['head'].mean(axis=1, dtype=np.float64)
+        
+        # Ani düşüş: geçmişin son ayı ile yeni aylar arasındaki çiftler
+        pairs = np.hstack([stats['tail'][:, -1:], block])
+        updated['drop_counts'] = OrderedDict(
+            (threshold, counts + _count_drops(pairs, threshold))
+            for threshold, counts in stats['drop_counts'].items()
+        )
+        
+        if 'neighbor_avg' in stats:
+            index = self._get_building_index()
+            updated['neighbor_avg'] = _neighbor_averages(updated['non_zero_avg'], index['building_codes'], index['own_codes'])
+        return updated
+    
+    def _report_progress(self, stage, done, total):
+        """İlerlemeyi bildir; analiz iptal edildiyse AnalysisCancelled fırlat"""
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise AnalysisCancelled(stage)
+        if self.progress_callback is not None:
+            self.progress_callback(stage, done, total)
+    
+    def rolling_trend_slopes(self, window=24):
+        """Tüm geçmiş için kayan pencere trend eğimleri (tesisat x pencere)"""
+        if self.df is None:
+            return np.empty((0, 0))
+        return rolling_trend_slopes(self._consumption_matrix(), window)
+    
+    def _consumption_matrix(self):
+        """Tarih sütunlarını tek bir float32 matrise çevir (tesisat x ay)"""
+        return self.df[self._get_schema().columns].to_numpy(dtype=np.float32)
+    
+    def _get_schema(self):
+        """Sütun şemasını döndür, yoksa oluştur"""
+        if self.schema is None:
+            self.schema = ColumnSchema(self.df.columns)
+        return self.schema
+    
+    def _get_building_index(self):
+        """Bina indeksini döndür, yoksa oluştur"""
+        if self.building_index is None:
+            self._build_building_index()
+        return self.building_index
+    
+    def _get_facility_index(self):
+        """Tesisat indeksini döndür, yoksa oluştur: TN metni -> satır konumu ve tarih sütunlarının konumları
+        
+        TN'ler arama kutusundaki metinle eşleşsin diye metin olarak tutulur;
+        aynı TN birden fazla satırdaysa ilk satır kullanılır.
+        """
+        if self.facility_index is None:
+            tn_text = self.df['TN'].astype(str).tolist()
+            self.facility_index = {
+                'tn_lookup': dict(zip(reversed(tn_text), range(len(tn_text) - 1, -1, -1))),
+                'column_positions': self.df.columns.get_indexer(self._get_schema().columns),
+            }
+        return self.facility_index
+    
+    def facility_row(self, tn):
+        """Tesisatın veri kümesindeki satır konumu; yoksa None (O(1))"""
+        if self.df is None:
+            return None
+        return self._get_facility_index()['tn_lookup'].get(str(tn))
+    
+    def facility_consumption(self, row):
+        """Satır konumundaki tesisatın aylık tüketimi (tarih sırasıyla, float64)"""
+        stats = self.facility_stats
+        if stats is not None and stats.get('data') is not None:
+            return stats['data'][row].astype(np.float64)
+        column_positions = self._get_facility_index()['column_positions']
+        return self.df.iloc[row, column_positions].to_numpy(dtype=np.float64)
+    
+    def _get_building_robust_stats(self):
+        """Bina içi robust istatistikleri döndür, yoksa bina indeksindeki ortalamalardan hesapla"""
+        index = self._get_building_index()
+        if 'robust' not in index:
+            with self.performance.stage('building_robust', len(index['facility_avg'])):
+                index['robust'] = _building_robust_stats(index['facility_avg'], index['building_codes'])
+        return index['robust']
+    
+    def building_statistics(self):
+        """Bina başına tesisat sayısı, ortalama tüketim medyanı, MAD ve yüzdelikler (BN indeksli)"""
+        if self.df is None:
+            return None
+        index = self._get_building_index()
+        robust = self._get_building_robust_stats()
+        columns = {'Tesisat_Sayısı': robust['count'], 'Medyan': robust['median'], 'MAD': robust['mad']}
+        for percentile in BUILDING_PERCENTILES:
+            columns[f'P{percentile}'] = robust[f'p{percentile}']
+        return pd.DataFrame(columns, index=pd.Index(list(index['building_lookup']), name='BN'))
+    
+    def building_profiles(self):
+        """Bina başına aylık medyan tüketim profili (bina x ay, float32)"""
+        index = self._get_building_index()
+        if 'profiles' not in index:
+            data = self._consumption_matrix()
+            codes = index['building_codes']
+            with self.performance.stage('building_profiles', len(data)):
+                profiles = pd.DataFrame(data[codes >= 0]).groupby(codes[codes >= 0]).median()
+                index['profiles'] = profiles.reindex(range(len(index['building_lookup']))).to_numpy(dtype=np.float32)
+        return index['profiles']
+    
+    def building_profile(self, bn):
+        """Binanın aylık medyan tüketim eğrisi; bina yoksa None"""
+        building = self._get_building_index()['building_lookup'].get(bn)
+        if building is None:
+            return None
+        return self.building_profiles()[building]
+    
+    def detect_anomalies_rowwise(self, low_threshold=30, neighbor_threshold=60, drop_threshold=70,
+                                 min_previous_winter=100, detectors=None):
+        """Satır bazlı referans uygulama (vektörel motorla eşdeğerlik kontrolü için)
+        
+        Bina içi z-skoru ve yüzdelik sıra sütunları sadece vektörel motorda üretilir.
+        """
+        if self.df is None:
+            return []
+        
+        date_columns = self._get_schema().columns
+        selected = resolve_detectors(detectors)
+        enabled = {detector.name for detector in selected}
+        suspicious_list = []
+        
+        for idx, row in self.df.iterrows():
+            tn = row['TN']
+            bn = row['BN']
+            consumption_data = row[date_columns].values
+            
+            # Anomali testleri
+            anomalies = []
+            risk_score = 0
+            
+            # 1. Ani düşüş tespiti
+            sudden_drops = self._detect_sudden_drops(consumption_data, drop_threshold)
+            if 'sudden_drop' in enabled and sudden_drops['count'] > 0:
+                anomalies.append(f"Ani düşüş: {sudden_drops['count']} kez")
+                risk_score += sudden_drops['count'] * 20
+            
+            # 2. Sıfır tüketim tespiti
+            zero_consumption = self._detect_zero_consumption(consumption_data)
+            if 'zero_consumption' in enabled and zero_consumption['count'] > 0:
+                anomalies.append(f"Sıfır tüketim: {zero_consumption['count']} ay")
+                risk_score += zero_consumption['count'] * 15
+            
+            # 3. Düşük tüketim tespiti
+            low_consumption = self._detect_low_consumption(consumption_data, low_threshold)
+            if 'low_consumption' in enabled and low_consumption['suspicious']:
+                anomalies.append(f"Düşük tüketim: Ortalama {low_consumption['avg_consumption']:.1f}")
+                risk_score += 25
+            
+            # 4. Trend analizi
+            trend_anomaly = self._detect_trend_anomaly(consumption_data)
+            if 'trend' in enabled and trend_anomaly['suspicious']:
+                anomalies.append(f"Trend anomalisi: {trend_anomaly['description']}")
+                risk_score += 30
+            
+            # 5. Mevsimsel anomali
+            seasonal_anomaly = self._detect_seasonal_anomaly(consumption_data)
+            if 'seasonal' in enabled and seasonal_anomaly['suspicious']:
+                anomalies.append(f"Mevsimsel anomali: {seasonal_anomaly['description']}")
+                risk_score += 20
+            
+            # 6. Komşu tesisatlarla karşılaştırma
+            neighbor_anomaly = self._compare_with_neighbors(bn, tn, consumption_data, neighbor_threshold)
+            if 'neighbor' in enabled and neighbor_anomaly['suspicious']:
+                anomalies.append(f"Komşu anomalisi: {neighbor_anomaly['description']}")
+                risk_score += 35
+            
+            # 7. Yıllık kış düşüşü
+            winter_drops = self._detect_winter_drops(consumption_data, drop_threshold, min_previous_winter)
+            if 'winter_drop' in enabled and winter_drops['count'] > 0:
+                anomalies.append(f"Kış düşüşü: {winter_drops['count']} kış önceki kışa göre")
+                risk_score += winter_drops['count'] * 25
+            
+            # 8. Bina içi aykırı değer
+            building_outlier = self._compare_with_building(bn, consumption_data)
+            if 'building_outlier' in enabled and building_outlier['suspicious']:
+                anomalies.append(f"Bina içi aykırı değer: {building_outlier['description']}")
+                risk_score += 30
+            
+            # Risk seviyesi belirleme
+            if risk_score >= 70:
+                risk_level = "Yüksek Risk"
+            elif risk_score >= 40:
+                risk_level = "Orta Risk"
+            elif risk_score >= 20:
+                risk_level = "Düşük Risk"
+            else:
+                risk_level = "Normal"
+            
+            if anomalies:
+                suspicious_list.append({
+                    'TN': tn,
+                    'BN': bn,
+                    'Risk_Skoru': risk_score,
+                    'Risk_Seviyesi': risk_level,
+                    'Anomaliler': '; '.join(anomalies),
+                    'Ortalama_Tuketim': np.mean(consumption_data),
+                    'Toplam_Tuketim': np.sum(consumption_data),
+                    'Son_6_Ay_Ortalama': np.mean(consumption_data[-6:]),
+                    'İlk_6_Ay_Ortalama': np.mean(consumption_data[:6]),
+                })
+        
+        return suspicious_list
+    
+    def _detect_sudden_drops(self, data, threshold=70):
+        """Ani düşüş tespiti"""
+        drops = 0
+        for i in range(1, len(data)):
+            if data[i-1] > 0 and data[i] < data[i-1] * ((100-threshold)/100):
+                drops += 1
+        return {'count': drops}
+    
+    def _detect_zero_consumption(self, data):
+        """Sıfır tüketim tespiti"""
+        zero_count = np.sum(data == 0)
+        return {'count': zero_count}
+    
+    def _detect_low_consumption(self, data, threshold=30):
+        """Düşük tüketim tespiti"""
+        non_zero_data = data[data > 0]
+        if len(non_zero_data) == 0:
+            return {'suspicious': True, 'avg_consumption': 0}
+        
+        avg_consumption = np.mean(non_zero_data)
+        
+        # Parametre olarak gelen threshold'u kullan
+        if avg_consumption < threshold:
+            return {'suspicious': True, 'avg_consumption': avg_consumption}
+        
+        return {'suspicious': False, 'avg_consumption': avg_consumption}
+    
+    def _detect_trend_anomaly(self, data):
+        """Trend anomalisi tespiti"""
+        # Son 24 ayın ortalamasını al
+        recent_data = data[-24:]
+        if len(recent_data) < 12:
+            return {'suspicious': False, 'description': ''}
+        
+        # Lineer trend hesapla
+        x = np.arange(len(recent_data))
+        z = np.polyfit(x, recent_data, 1)
+        trend_slope = z[0]
+        
+        # Eğer trend çok negatifse (sürekli azalma) şüpheli
+        if trend_slope < -5:
+            return {'suspicious': True, 'description': 'Sürekli azalan tüketim trendi'}
+        
+        return {'suspicious': False, 'description': ''}
+    
+    def _detect_seasonal_anomaly(self, data):
+        """Mevsimsel anomali tespiti"""
+        if len(data) < 24:
+            return {'suspicious': False, 'description': ''}
+        
+        # Kış ayları (Aralık, Ocak, Şubat) ve yaz ayları (Haziran, Temmuz, Ağustos)
+        # Takvim ayları sütun şemasından gelir
+        schema = self._get_schema()
+        winter_months = data[schema.winter_idx]
+        summer_months = data[schema.summer_idx]
+        
+        if len(winter_months) > 0 and len(summer_months) > 0:
+            winter_avg = np.mean(winter_months)
+            summer_avg = np.mean(summer_months)
+            
+            # Kış aylarında tüketim yaz aylarından az ise şüpheli
+            if winter_avg < summer_avg * 0.8:
+                return {'suspicious': True, 'description': 'Kış aylarında beklenenden düşük tüketim'}
+        
+        return {'suspicious': False, 'description': ''}
+    
+    def _detect_winter_drops(self, data, threshold=70, min_previous=100):
+        """Yıllık kış düşüşü tespiti (takvim kışları, bir önceki kışa göre)"""
+        schema = self._get_schema()
+        winter_means = [np.mean(data[season]) for season in schema.winter_seasons]
+        drops = 0
+        for previous, current in zip(winter_means, winter_means[1:]):
+            if previous >= min_previous and current < previous * ((100-threshold)/100):
+                drops += 1
+        return {'count': drops}
+    
+    def _compare_with_neighbors(self, bn, tn, data, threshold=60):
+        """Komşu tesisatlarla karşılaştırma (bina indeksi üzerinden O(1))"""
+        index = self._get_building_index()
+        
+        # Aynı binadaki tesisatlar
+        building = index['building_lookup'].get(bn)
+        if building is None:
+            return {'suspicious': False, 'description': ''}
+        neighbor_sum = index['building_sum'][building]
+        neighbor_count = index['building_count'][building]
+        
+        # Kendi verisini çıkar
+        own = index['own_lookup'].get((bn, tn))
+        if own is not None:
+            neighbor_sum -= index['own_sum'][own]
+            neighbor_count -= index['own_count'][own]
+        
+        if neighbor_count <= 0:
+            return {'suspicious': False, 'description': ''}
+        
+        neighbor_avg = neighbor_sum / neighbor_count
+        current_avg = np.mean(data[data > 0])
+        
+        # Parametre olarak gelen threshold'u kullan
+        if current_avg < neighbor_avg * (threshold/100):
+            return {'suspicious': True, 'description': f'Komşulardan {((neighbor_avg - current_avg) / neighbor_avg * 100):.0f}% daha az tüketim'}
+        
+        return {'suspicious': False, 'description': ''}
+
+    def _compare_with_building(self, bn, data):
+        """Bina medyanı ve MAD ile robust z-skoru (bina istatistikleri üzerinden O(1))"""
+        building = self._get_building_index()['building_lookup'].get(bn)
+        if building is None:
+            return {'suspicious': False, 'description': ''}
+        robust = self._get_building_robust_stats()
+        
+        current_avg = np.mean(data[data > 0])
+        z = (current_avg - robust['median'][building]) / robust['scale'][building]
+        if z < BUILDING_OUTLIER_Z:
+            return {'suspicious': True, 'description': 'Bina medyanının belirgin altında tüketim'}
+        
+        return {'suspicious': False, 'description': ''}
+
+class AnalysisJob:
+    """Anomali analizini arka planda bir iş parçacığında çalıştırır
+    
+    İlerleme (aşama, tamamlanan, toplam) her bildirimde güncellenir; cancel()
+    bir sonraki kontrol noktasında analizi durdurur. Aynı dedektör üzerinde
+    aynı anda tek bir analiz çalışır.
+    """
+    def __init__(self, detector, low_threshold=30, neighbor_threshold=60, drop_threshold=70,
+                 min_previous_winter=100, detectors=None, track_memory=False, n_jobs=None):
+        self.detector = detector
+        self.thresholds = (low_threshold, neighbor_threshold, drop_threshold, min_previous_winter)
+        self.detectors = detectors
+        self.track_memory = track_memory
+        self.n_jobs = n_jobs
+        self.cancel_event = threading.Event()
+        self.stage = None
+        self.done_units = 0
+        self.total_units = 0
+        
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='anomali')
+        self.future = executor.submit(self._run)
+        executor.shutdown(wait=False)
+    
+    def _run(self):
+        with self.detector.analysis_lock:
+            self.detector.progress_callback = self._update
+            self.detector.cancel_event = self.cancel_event
+            try:
+                return self.detector.detect_anomalies_result(
+                    *self.thresholds, detectors=self.detectors, track_memory=self.track_memory, n_jobs=self.n_jobs
+                )
+            finally:
+                self.detector.progress_callback = None
+                self.detector.cancel_event = None
+    
+    def _update(self, stage, done, total):
+        self.stage, self.done_units, self.total_units = stage, done, total
+    
+    @property
+    def progress(self):
+        """Mevcut aşamanın tamamlanma oranı (0-1)"""
+        if self.done():
+            return 1.0
+        return self.done_units / self.total_units if self.total_units else 0.0
+    
+    def cancel(self):
+        self.cancel_event.set()
+    
+    def done(self):
+        return self.future.done()
+    
+    def wait(self, timeout=None):
+        """İş bitene kadar (en fazla timeout sn) bekle; bittiyse True"""
+        done, _ = wait([self.future], timeout=timeout)
+        return bool(done)
+    
+    @property
+    def cancelled(self):
+        return self.done() and isinstance(self.future.exception(), AnalysisCancelled)
+    
+    def result(self):
+        """Analiz sonucu (AnomalyResult); hata veya iptal durumunda istisnayı yükseltir"""
+        return self.future.result()
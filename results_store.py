@@ -0,0 +1,230 @@
+import json
+import logging
+import os
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from gas_leak_detector import RISK_LEVELS, GasLeakDetector
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS datasets (
+    dataset_hash TEXT PRIMARY KEY,
+    periods TEXT NOT NULL,
+    n_facilities INTEGER NOT NULL,
+    created TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS consumption (
+    dataset_hash TEXT NOT NULL,
+    tn,
+    bn,
+    row_index INTEGER NOT NULL,
+    monthly BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS consumption_tn ON consumption (tn, dataset_hash);
+CREATE INDEX IF NOT EXISTS consumption_bn ON consumption (bn, dataset_hash);
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_date TEXT NOT NULL,
+    dataset_hash TEXT NOT NULL REFERENCES datasets (dataset_hash),
+    low_threshold REAL NOT NULL,
+    neighbor_threshold REAL NOT NULL,
+    drop_threshold REAL NOT NULL,
+    min_previous_winter REAL NOT NULL,
+    detectors TEXT NOT NULL,
+    n_facilities INTEGER NOT NULL,
+    n_suspicious INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_date ON runs (run_date);
+CREATE INDEX IF NOT EXISTS runs_dataset ON runs (dataset_hash, run_date);
+CREATE TABLE IF NOT EXISTS results (
+    run_id INTEGER NOT NULL REFERENCES runs (run_id),
+    tn,
+    bn,
+    risk_score INTEGER NOT NULL,
+    risk_level INTEGER NOT NULL,
+    detector_mask INTEGER NOT NULL,
+    mean_consumption REAL,
+    total_consumption REAL,
+    last_6_mean REAL,
+    first_6_mean REAL
+);
+CREATE INDEX IF NOT EXISTS results_tn ON results (tn, run_id);
+CREATE INDEX IF NOT EXISTS results_bn ON results (bn, run_id);
+CREATE INDEX IF NOT EXISTS results_run ON results (run_id, risk_score);
+"""
+
+def _sql_values(values):
+    """numpy dizisini SQLite'a yazılabilir Python değerlerine çevir (NaN -> NULL)"""
+    values = pd.Series(values)
+    return values.astype(object).where(values.notna(), None).tolist()
+
+def _sql_value(value):
+    """Tek bir TN/BN değerini sorgu parametresine çevir (numpy skalerleri Python'a)"""
+    return value.item() if isinstance(value, np.generic) else value
+
+class ResultStore:
+    """Analiz sonuçlarının yerel SQLite deposu
+
+    Her veri kümesinin tüketim matrisi (dosya özetiyle, tesisat başına bir
+    satır) bir kez, her analiz çalıştırmasının şüpheli tesisatları ise eşik ve
+    tarih bilgisiyle saklanır. TN, BN ve çalıştırma tarihi indeksli olduğundan
+    bir tesisatın tüketim eğrisi ve risk geçmişi kaynak dosyalar yeniden
+    yüklenmeden nokta sorgusuyla okunur. Her işlem kendi bağlantısını açar;
+    Streamlit iş parçacıklarından güvenle çağrılabilir.
+    """
+    DEFAULT_PATH = os.path.join(GasLeakDetector.CACHE_DIR, 'sonuclar.sqlite')
+
+    # executemany ile bu kadar satırlık parçalar halinde yazılır
+    INSERT_CHUNK_ROWS = 50_000
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _insert_rows(self, conn, sql, columns):
+        """Sütun listelerini parçalar halinde satır satır ekle"""
+        n_rows = len(columns[0])
+        for start in range(0, n_rows, self.INSERT_CHUNK_ROWS):
+            end = min(start + self.INSERT_CHUNK_ROWS, n_rows)
+            conn.executemany(sql, zip(*(column[start:end] for column in columns)))
+
+    def has_dataset(self, dataset_hash):
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT 1 FROM datasets WHERE dataset_hash = ?", (dataset_hash,)).fetchone()
+        return row is not None
+
+    def save_dataset(self, dataset_hash, detector):
+        """Dedektörün tüketim matrisini veri kümesi özetiyle sakla (zaten varsa atlanır)"""
+        if self.has_dataset(dataset_hash):
+            return False
+
+        schema = detector._get_schema()
+        data = detector._consumption_matrix()
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT INTO datasets (dataset_hash, periods, n_facilities, created) VALUES (?, ?, ?, ?)",
+                (dataset_hash, json.dumps(schema.labels()), len(data), datetime.now().isoformat(timespec='seconds'))
+            )
+            self._insert_rows(
+                conn,
+                "INSERT INTO consumption (dataset_hash, tn, bn, row_index, monthly) VALUES (?, ?, ?, ?, ?)",
+                [
+                    [dataset_hash] * len(data),
+                    _sql_values(detector.df['TN'].to_numpy()),
+                    _sql_values(detector.df['BN'].to_numpy()),
+                    list(range(len(data))),
+                    [row.tobytes() for row in data],
+                ]
+            )
+        logger.info("Veri kümesi kaydedildi: %s (%d tesisat)", dataset_hash[:12], len(data))
+        return True
+
+    def save_run(self, dataset_hash, detector, result, thresholds, run_date=None):
+        """Bir analiz çalıştırmasını şüpheli tesisatlarıyla sakla; run_id döndür
+
+        Veri kümesi daha önce kaydedilmemişse tüketim matrisi de yazılır.
+        Çalıştırılan dedektörler sonuçla birlikte saklanır.
+        """
+        self.save_dataset(dataset_hash, detector)
+        run_date = run_date or datetime.now().isoformat(timespec='seconds')
+        low_threshold, neighbor_threshold, drop_threshold, min_previous_winter = thresholds
+
+        with closing(self._connect()) as conn, conn:
+            cursor = conn.execute(
+                "INSERT INTO runs (run_date, dataset_hash, low_threshold, neighbor_threshold, drop_threshold, "
+                "min_previous_winter, detectors, n_facilities, n_suspicious) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (run_date, dataset_hash, low_threshold, neighbor_threshold, drop_threshold, min_previous_winter,
+                 ','.join(result.detectors), len(detector.df), len(result))
+            )
+            run_id = cursor.lastrowid
+            self._insert_rows(
+                conn,
+                "INSERT INTO results (run_id, tn, bn, risk_score, risk_level, detector_mask, mean_consumption, "
+                "total_consumption, last_6_mean, first_6_mean) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    [run_id] * len(result),
+                    _sql_values(result.tn),
+                    _sql_values(result.bn),
+                    result.risk_scores.tolist(),
+                    result.level_codes.tolist(),
+                    result.mask.tolist(),
+                    _sql_values(result.mean),
+                    _sql_values(result.total),
+                    _sql_values(result.last_6_mean),
+                    _sql_values(result.first_6_mean),
+                ]
+            )
+        logger.info("Analiz kaydedildi: çalıştırma %d, %d şüpheli tesisat", run_id, len(result))
+        return run_id
+
+    def runs(self):
+        """Kayıtlı çalıştırmalar, en yeniden eskiye"""
+        with closing(self._connect()) as conn:
+            return pd.read_sql_query("SELECT * FROM runs ORDER BY run_date DESC, run_id DESC", conn)
+
+    def consumption_curve(self, tn, dataset_hash=None):
+        """Tesisatın tüketim eğrisi: (YYYY/AA etiketleri, değerler); yoksa None
+
+        dataset_hash verilmezse tesisatı içeren en son kaydedilen veri kümesi kullanılır.
+        """
+        query = (
+            "SELECT d.periods, c.monthly FROM consumption c JOIN datasets d USING (dataset_hash) "
+            "WHERE c.tn = ?"
+        )
+        params = [_sql_value(tn)]
+        if dataset_hash is not None:
+            query += " AND c.dataset_hash = ?"
+            params.append(dataset_hash)
+        query += " ORDER BY d.created DESC, c.row_index LIMIT 1"
+
+        with closing(self._connect()) as conn:
+            row = conn.execute(query, params).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), np.frombuffer(row[1], dtype=np.float32)
+
+    def risk_history(self, tn):
+        """Tesisatın kayıtlı çalıştırmalardaki risk skoru ve seviyesi, tarih sırasıyla
+
+        Tesisatın şüpheli çıkmadığı çalıştırmalarda skor 0, seviye 'Normal' olur.
+        """
+        tn = _sql_value(tn)
+        with closing(self._connect()) as conn:
+            history = pd.read_sql_query(
+                "SELECT r.run_id, r.run_date, r.low_threshold, r.neighbor_threshold, r.drop_threshold, "
+                "r.min_previous_winter, r.detectors, "
+                "s.risk_score, s.risk_level FROM runs r "
+                "JOIN (SELECT DISTINCT dataset_hash FROM consumption WHERE tn = ?) d USING (dataset_hash) "
+                "LEFT JOIN results s ON s.run_id = r.run_id AND s.tn = ? "
+                "ORDER BY r.run_date, r.run_id",
+                conn, params=(tn, tn)
+            )
+        history['risk_score'] = history['risk_score'].fillna(0).astype(int)
+        history['risk_level'] = RISK_LEVELS[history['risk_level'].fillna(0).astype(int)]
+        return history
+
+    def building_history(self, bn):
+        """Binanın her çalıştırmadaki şüpheli tesisat sayısı ve ortalama risk skoru"""
+        with closing(self._connect()) as conn:
+            return pd.read_sql_query(
+                "SELECT r.run_id, r.run_date, COUNT(*) AS suspicious_count, AVG(s.risk_score) AS mean_risk_score "
+                "FROM results s JOIN runs r USING (run_id) WHERE s.bn = ? "
+                "GROUP BY r.run_id ORDER BY r.run_date, r.run_id",
+                conn, params=(_sql_value(bn),)
+            )
@@ -0,0 +1,249 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmark import generate_consumption_data
+from gas_leak_detector import (
+    BUILDING_MIN_FACILITIES, BUILDING_OUTLIER_Z, DETECTORS, MAD_SCALE, MEAN_AD_SCALE, AnalysisJob, GasLeakDetector,
+    resolve_detectors, rolling_trend_slopes, trend_slopes,
+)
+
+THRESHOLDS = [
+    (30, 60, 70, 100),
+    (50, 40, 55, 50),
+    (10, 80, 90, 200),
+]
+
+@pytest.fixture(scope='module')
+def detector():
+    """Sentetik veri; BN'si eksik satırlar, tekrarlanan TN'ler ve tamamen sıfır bir satır içerir"""
+    df = generate_consumption_data(400, seed=1).drop(columns='Enjekte_Desen')
+    df['BN'] = df['BN'].astype(float)
+    df.loc[[3, 50, 51], 'BN'] = np.nan
+    df.loc[[10, 11], 'TN'] = df.loc[9, 'TN']
+    df.loc[120, 'TN'] = df.loc[121, 'TN']
+    df.iloc[200, 2:] = 0
+
+    detector = GasLeakDetector()
+    detector.df = df
+    detector.preprocess_data()
+    return detector
+
+def neighbor_scan(detector):
+    """Özgün komşu karşılaştırması: binadaki diğer tesisatlar BN ile süzülüp tek tek ortalanır"""
+    df = detector.df
+    data = df[detector.schema.columns].to_numpy(dtype=np.float64)
+    averages = pd.Series([np.mean(row[row > 0]) if (row > 0).any() else np.nan for row in data])
+
+    def compare(bn, tn, data, threshold=60):
+        neighbor_consumptions = averages[((df['BN'] == bn) & (df['TN'] != tn)).to_numpy()].dropna()
+        if neighbor_consumptions.empty:
+            return {'suspicious': False, 'description': ''}
+
+        current_avg = np.mean(data[data > 0])
+        neighbor_avg = np.mean(neighbor_consumptions)
+        if current_avg < neighbor_avg * (threshold / 100):
+            return {'suspicious': True, 'description': f'Komşulardan {((neighbor_avg - current_avg) / neighbor_avg * 100):.0f}% daha az tüketim'}
+        return {'suspicious': False, 'description': ''}
+    return compare
+
+def building_reference(detector):
+    """Bina içi robust z-skoru ve yüzdelik sıra, pandas groupby ile (tesisat başına ve bina başına)"""
+    data = detector.df[detector.schema.columns].to_numpy(dtype=np.float64)
+    averages = pd.DataFrame(data).where(data > 0).mean(axis=1)
+    frame = pd.DataFrame({'BN': detector.df['BN'].to_numpy(), 'avg': averages}).dropna()
+
+    groups = frame.groupby('BN')['avg']
+    count = groups.transform('count')
+    median = groups.transform('median')
+    deviation = (frame['avg'] - median).abs()
+    mad = deviation.groupby(frame['BN']).transform('median')
+    mean_ad = deviation.groupby(frame['BN']).transform('mean')
+    scale = pd.Series(np.where(mad > 0, MAD_SCALE * mad, MEAN_AD_SCALE * mean_ad), index=frame.index)
+    scale = scale.where((count >= BUILDING_MIN_FACILITIES) & (scale > 0))
+
+    facilities = pd.DataFrame({
+        'z': (frame['avg'] - median) / scale,
+        'rank': (groups.rank(method='average') - 0.5) / count,
+    }).reindex(range(len(detector.df)))
+    buildings = pd.DataFrame({'BN': frame['BN'], 'median': median, 'scale': scale}).groupby('BN').first()
+    return facilities, buildings
+
+def building_scan(buildings):
+    """Bina içi aykırı değer karşılaştırması, pandas ile hesaplanan bina medyanı ve ölçeğiyle"""
+    def compare(bn, data):
+        if bn not in buildings.index:
+            return {'suspicious': False, 'description': ''}
+        z = (np.mean(data[data > 0]) - buildings.loc[bn, 'median']) / buildings.loc[bn, 'scale']
+        if z < BUILDING_OUTLIER_Z:
+            return {'suspicious': True, 'description': 'Bina medyanının belirgin altında tüketim'}
+        return {'suspicious': False, 'description': ''}
+    return compare
+
+@pytest.mark.parametrize('thresholds', THRESHOLDS)
+@pytest.mark.parametrize('detectors', [None, list(DETECTORS), ['zero_consumption', 'low_consumption']])
+def test_vectorized_matches_rowwise(detector, thresholds, detectors, monkeypatch):
+    # Satır bazlı referans, bina indeksi ve bina istatistikleri yerine bağımsız hesaplarla çalışır
+    facilities, buildings = building_reference(detector)
+    monkeypatch.setattr(detector, '_compare_with_neighbors', neighbor_scan(detector))
+    monkeypatch.setattr(detector, '_compare_with_building', building_scan(buildings))
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        expected = pd.DataFrame(detector.detect_anomalies_rowwise(*thresholds, detectors=detectors))
+    result = detector.detect_anomalies_result(*thresholds, detectors=detectors)
+    actual = result.to_frame()
+
+    assert list(actual.columns.drop(['Bina_Z_Skoru', 'Bina_Yüzdelik_Sırası'])) == list(expected.columns)
+    assert len(actual) == len(expected)
+    assert (actual['TN'].to_numpy() == expected['TN'].to_numpy()).all()
+    assert (actual['Anomaliler'] == expected['Anomaliler']).all()
+    assert (actual['Risk_Skoru'].to_numpy() == expected['Risk_Skoru'].to_numpy()).all()
+    assert (actual['Risk_Seviyesi'] == expected['Risk_Seviyesi']).all()
+    for column in ('Ortalama_Tuketim', 'Toplam_Tuketim', 'Son_6_Ay_Ortalama', 'İlk_6_Ay_Ortalama'):
+        np.testing.assert_allclose(actual[column].astype(float), expected[column].astype(float), rtol=1e-6)
+
+    # Bina içi konum sadece komşu veya bina içi aykırı değer dedektörü çalıştığında hesaplanır
+    if {'neighbor', 'building_outlier'} & {item.name for item in resolve_detectors(detectors)}:
+        reference = facilities.iloc[result.rows]
+        assert np.isfinite(result.building_z).any()
+        np.testing.assert_allclose(result.building_z, reference['z'], rtol=1e-5, atol=1e-5)
+        np.testing.assert_allclose(actual['Bina_Yüzdelik_Sırası'], reference['rank'] * 100, rtol=1e-6)
+    else:
+        assert actual[['Bina_Z_Skoru', 'Bina_Yüzdelik_Sırası']].isna().all().all()
+
+@pytest.mark.parametrize('thresholds', THRESHOLDS)
+def test_result_matches_records(detector, thresholds):
+    result = detector.detect_anomalies_result(*thresholds)
+    records = pd.DataFrame(detector.detect_anomalies(*thresholds))
+
+    assert len(result) == len(records)
+    assert (result.risk_scores == records['Risk_Skoru'].to_numpy()).all()
+    assert (detector.df['TN'].to_numpy()[result.rows] == records['TN'].to_numpy()).all()
+
+def test_all_zero_row_is_flagged(detector):
+    records = pd.DataFrame(detector.detect_anomalies(*THRESHOLDS[0]))
+    zero_row = records[records['TN'] == detector.df['TN'].iloc[200]]
+    assert len(zero_row) == 1
+    assert f"Sıfır tüketim: {len(detector.schema)} ay" in zero_row['Anomaliler'].iloc[0]
+
+def test_building_outlier_is_opt_in(detector):
+    default = detector.detect_anomalies_result()
+    assert 'building_outlier' not in default.details
+    assert np.isfinite(default.building_z).any()
+
+    opted_in = detector.detect_anomalies_result(detectors=list(DETECTORS))
+    assert 'building_outlier' in opted_in.details
+
+def test_single_file_skips_merge_only_when_tns_unique(tmp_path):
+    df = generate_consumption_data(50, seed=2).drop(columns='Enjekte_Desen')
+    unique_path, duplicate_path = tmp_path / 'tekil.csv', tmp_path / 'tekrarli.csv'
+    df.to_csv(unique_path, index=False)
+    df.assign(TN=df['TN'] % 40).to_csv(duplicate_path, index=False)
+
+    loaded = GasLeakDetector()
+    assert loaded.load_files([str(unique_path)])
+    assert 'merge_by_tn' not in set(loaded.load_performance.to_frame()['Aşama'])
+    merged = GasLeakDetector()
+    assert merged.load_files([str(unique_path), str(unique_path)])
+    pd.testing.assert_frame_equal(loaded.df, merged.df)
+
+    duplicates = GasLeakDetector()
+    assert duplicates.load_files([str(duplicate_path)])
+    assert duplicates.df['TN'].is_unique and len(duplicates.df) == 40
+
+def test_background_job_times_each_stage():
+    detector = GasLeakDetector()
+    detector.df = generate_consumption_data(300, seed=3).drop(columns='Enjekte_Desen')
+    detector.preprocess_data()
+    detector.PROGRESS_BLOCK_ROWS = 70
+
+    timings = AnalysisJob(detector).future.result().performance.to_frame()
+    stats_stages = timings[timings['Düzey'] == 2].set_index('Aşama')
+    for stage in ('zero_consumption', 'trend', 'seasonal', 'winter_means', 'neighbor'):
+        assert stage in stats_stages.index
+    assert stats_stages.loc['trend', 'Satır_Sayısı'] == 300
+
+def test_parallel_matches_serial(monkeypatch):
+    df = generate_consumption_data(600, seed=4).drop(columns='Enjekte_Desen')
+    serial, parallel = GasLeakDetector(), GasLeakDetector()
+    for item in (serial, parallel):
+        item.df = df.copy()
+        item.preprocess_data()
+    parallel.PARALLEL_MIN_ROWS = 100
+
+    # İşçi sayısı sadece bu çalıştırmaya uygulanır, dedektörün n_jobs değeri değişmez
+    calls = []
+    compute_parallel = parallel._compute_facility_stats_parallel
+    monkeypatch.setattr(parallel, '_compute_facility_stats_parallel', lambda *args: calls.append(1) or compute_parallel(*args))
+    expected = serial.detect_anomalies_result(*THRESHOLDS[0], detectors=list(DETECTORS))
+    actual = parallel.detect_anomalies_result(*THRESHOLDS[0], detectors=list(DETECTORS), n_jobs=2)
+    assert calls and parallel.n_jobs == 1
+
+    pd.testing.assert_frame_equal(actual.to_frame(), expected.to_frame())
+    for name, counts in expected.details.items():
+        np.testing.assert_array_equal(actual.details[name], counts)
+
+@pytest.mark.parametrize('fractional', [False, True])
+def test_delta_matches_full_analysis(tmp_path, fractional):
+    df = generate_consumption_data(400, seed=5).drop(columns='Enjekte_Desen')
+    months = [column for column in df.columns[2:] if not column.startswith('2025/') or column in ('2025/1', '2025/2', '2025/3')]
+    df = df[['TN', 'BN'] + months]
+    if fractional:
+        df[months] = (df[months] * np.random.default_rng(5).uniform(0.5, 1.5, (len(df), len(months)))).round(3)
+    # Delta, geçmişteki son kışı (Aralık 2024) tamamlayan Ocak-Mart 2025 aylarıdır
+    delta_months = ['2025/1', '2025/2', '2025/3']
+    paths = {name: str(tmp_path / f'{name}.csv') for name in ('history', 'delta', 'full')}
+    df.drop(columns=delta_months).to_csv(paths['history'], index=False)
+    df[['TN', 'BN'] + delta_months].to_csv(paths['delta'], index=False)
+    df.to_csv(paths['full'], index=False)
+    cache_dir = str(tmp_path / 'cache')
+
+    full = GasLeakDetector()
+    assert full.load_files([paths['full']]) and full.preprocess_data()
+
+    history = GasLeakDetector()
+    assert history.load_files([paths['history']]) and history.preprocess_data()
+    # Ani düşüş önbelleği delta öncesinde dolu olmalı; güncellemede birikimli olarak taşınır
+    history.detect_anomalies_result(*THRESHOLDS[0], detectors=list(DETECTORS))
+    assert history.save_cache('gecmis', cache_dir) and history.save_stats('gecmis', cache_dir)
+
+    reloaded = GasLeakDetector()
+    assert reloaded.load_cache('gecmis', cache_dir) and reloaded.load_stats('gecmis', cache_dir)
+    assert reloaded.facility_stats['data'] is None
+
+    for updated in (history, reloaded):
+        assert updated.apply_delta(paths['delta'])
+        carried = [THRESHOLDS[0][2]] if updated is history else []
+        assert list(updated.facility_stats['drop_counts']) == carried
+        for thresholds in THRESHOLDS:
+            expected = full.detect_anomalies_result(*thresholds, detectors=list(DETECTORS))
+            actual = updated.detect_anomalies_result(*thresholds, detectors=list(DETECTORS))
+            expected_frame, actual_frame = expected.to_frame(), actual.to_frame()
+
+            assert (actual_frame['TN'].to_numpy() == expected_frame['TN'].to_numpy()).all()
+            assert (actual_frame['Anomaliler'] == expected_frame['Anomaliler']).all()
+            assert (actual.risk_scores == expected.risk_scores).all()
+            for column in ('Ortalama_Tuketim', 'Toplam_Tuketim', 'Son_6_Ay_Ortalama', 'İlk_6_Ay_Ortalama',
+                           'Bina_Z_Skoru', 'Bina_Yüzdelik_Sırası'):
+                np.testing.assert_allclose(actual_frame[column], expected_frame[column], rtol=1e-5, atol=1e-4)
+
+@pytest.mark.parametrize('n_months', [6, 11, 12, 13, 24, 30])
+def test_trend_slopes_match_polyfit(n_months):
+    data = np.random.default_rng(n_months).gamma(4, 25, (50, n_months)).astype(np.float32)
+    slopes = trend_slopes(data)
+    if n_months < 12:
+        assert np.isnan(slopes).all()
+    else:
+        expected = np.polyfit(np.arange(n_months), data.T.astype(np.float64), 1)[0]
+        np.testing.assert_allclose(slopes, expected, rtol=1e-9, atol=1e-9)
+
+@pytest.mark.parametrize('n_months, window', [(10, 24), (24, 24), (40, 24), (30, 12), (5, 3)])
+def test_rolling_trend_slopes_match_polyfit(n_months, window):
+    data = np.random.default_rng(n_months).gamma(4, 25, (50, n_months)).astype(np.float32)
+    slopes = rolling_trend_slopes(data, window=window, block_rows=7)
+    assert slopes.shape == (50, max(n_months - window + 1, 0))
+    for start in range(slopes.shape[1]):
+        expected = np.polyfit(np.arange(window), data[:, start:start + window].T.astype(np.float64), 1)[0]
+        np.testing.assert_allclose(slopes[:, start], expected, rtol=1e-9, atol=1e-9)
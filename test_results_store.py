@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from benchmark import generate_consumption_data
+from gas_leak_detector import GasLeakDetector
+from results_store import ResultStore
+
+THRESHOLDS = (30, 60, 70, 100)
+
+@pytest.fixture
+def detector():
+    detector = GasLeakDetector()
+    detector.df = generate_consumption_data(200, seed=6).drop(columns='Enjekte_Desen')
+    detector.preprocess_data()
+    return detector
+
+@pytest.fixture
+def store(tmp_path):
+    return ResultStore(str(tmp_path / 'sonuclar.sqlite'))
+
+def test_risk_history_fills_runs_where_facility_was_not_suspicious(detector, store):
+    flagged = detector.detect_anomalies_result(*THRESHOLDS)
+    zeros_only = detector.detect_anomalies_result(*THRESHOLDS, detectors=['zero_consumption'])
+    # İlk çalıştırmada şüpheli, ikincisinde şüpheli olmayan bir tesisat
+    position = next(i for i, tn in enumerate(flagged.tn) if tn not in set(zeros_only.tn.tolist()))
+    tn = flagged.tn[position]
+
+    first = store.save_run('veri', detector, flagged, THRESHOLDS, run_date='2025-01-01T00:00:00')
+    second = store.save_run('veri', detector, zeros_only, THRESHOLDS, run_date='2025-02-01T00:00:00')
+
+    history = store.risk_history(tn)
+    assert history['run_id'].tolist() == [first, second]
+    assert history['risk_score'].tolist() == [int(flagged.risk_scores[position]), 0]
+    assert history['risk_level'].tolist() == [flagged.to_frame([position])['Risk_Seviyesi'].iloc[0], 'Normal']
+    assert history['detectors'].tolist() == [','.join(flagged.detectors), 'zero_consumption']
+
+def test_risk_history_only_includes_runs_of_datasets_with_the_facility(detector, store):
+    result = detector.detect_anomalies_result(*THRESHOLDS)
+    store.save_run('veri', detector, result, THRESHOLDS)
+
+    other = GasLeakDetector()
+    other.df = detector.df.iloc[1:].reset_index(drop=True)
+    other.preprocess_data()
+    store.save_run('diger', other, other.detect_anomalies_result(*THRESHOLDS), THRESHOLDS)
+
+    assert len(store.risk_history(detector.df['TN'].iloc[0])) == 1
+    assert len(store.risk_history(detector.df['TN'].iloc[1])) == 2
+    assert store.risk_history(-1).empty
+
+def test_consumption_curve_reads_the_stored_row(detector, store):
+    store.save_run('veri', detector, detector.detect_anomalies_result(*THRESHOLDS), THRESHOLDS)
+
+    row = 17
+    labels, values = store.consumption_curve(detector.df['TN'].iloc[row])
+    assert labels == detector.schema.labels()
+    np.testing.assert_array_equal(values, detector.facility_consumption(row).astype(np.float32))
+    assert store.consumption_curve(detector.df['TN'].iloc[row], dataset_hash='yok') is None
+    assert store.consumption_curve(-1) is None